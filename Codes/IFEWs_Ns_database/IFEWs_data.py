@@ -39,11 +39,16 @@ Time Scale = 1968** till Current Year-1
 Spatial Scale = Iowa Counties
 
 **Why 1968: animal data constrained 
+
+Output: year-partitioned Ns database (ns_store.NsStore) in 'Ns database'.
+Incremental update (IFEWS_INCREMENTAL=1 in .env): only the last
+IFEWS_REVISION_YEARS (default 2) stored years and the new years are fetched
+again from USDA (the older years are cut from the cached USDA responses, also
+those of the last full run), only the N rate of new or changed years is read and CN, MN,
+FN, GN and NS are only recomputed for the years whose inputs changed.
 ============================================
 """
 import os
-# Get data
-os.chdir(r'C:\Users\jbrittes\Documents\Research\IFEWs_model_v3_1\data')
 # Import necessary libraries
 import pandas as pd
 from dotenv import load_dotenv
@@ -58,109 +63,146 @@ from helper_functions import (
     process_data_crop, process_data_animal, expand_df, refine_animal_data,
      calculate_manure_n, calculate_fix_n, calculate_grain_n, calculate_ns, interpolation
     )
-from caopeiyu_nrate import nrate_iowa_counties
-
-# Define animal and crop parameters
-animal_parameters = [hogs, hogs_others, beef, milk, other_cattle, on_feed]
-crop_parameters = [corng_y, corng_pa, corng_ha, soy_y, soy_pa, soy_ha]
-
-# Process animal and crop data
-animal_df = process_data_animal(animal_parameters)
-crop_df = process_data_crop(crop_parameters)
-
-animal_df.rename(columns={'county_name': "CountyName", 'year':'Year'
-            }, inplace=True)
-crop_df.rename(columns={'county_name': "CountyName", 'year':'Year'
-            }, inplace=True)
-
-crop_df.drop(crop_df[crop_df['CountyName'] == 'OTHER COUNTIES'].index, inplace = True)
-crop_df.drop(crop_df[crop_df['CountyName'] == 'OTHER (COMBINED) COUNTIES'].index, inplace = True)
-
-# ---------------------Validation - Yearly values for Iowa from USDA ----------------------
-crop_val = cp()
-animal_val = ap()
-
-# expanded - expand so both final df has the same amount of years
-animal_df = expand_df(df = animal_df, validation_df = crop_val)
-crop_df = expand_df(df = crop_df, validation_df = crop_val)
-
-# numeric
-cols = [ i for i in animal_df.columns if i not in ['CountyName', 'Year']]
-for col in cols:
-    animal_df[col] = pd.to_numeric(animal_df[col])
-
-cols = [ i for i in crop_df.columns if i not in ['CountyName', 'Year']]
-for col in cols:
-    crop_df[col] = pd.to_numeric(crop_df[col])
-
-
-animal_ifews = refine_animal_data(animal_df, animal_val)
-crops_ifews = interpolation(crop_df)
-
-#--------------- merge USDA data ---------------------------------------------------
-df_USDA = pd.merge(animal_ifews, crops_ifews, on=['CountyName', 'Year'], how='left')
-
-# ---------------------- N fetilizer to Counties (Peiyu Cao) ------------------------------
-parent_dir = os.getcwd()
-nrate_gdf = nrate_iowa_counties(parent_dir)
-
-# ---------------------- Merge USDA and Nrate data ----------------------------------------
-"""
-This section calculates the surplus based on Vishal's work:
-The below modeling addresses the agricutlure and water (nitrogen surplus as a water
-quality indicador) of the IFEWs.
-The calculation of nitrogen surplus (Ns) is based on the construction of a rough agronomic
-annual nitrogen budget (Blesh and Drinkwater, 2013; Jones et al., 2019a) given as:
-
-Ns = CN + MN + FN - GN
-
-where CN is the input from the application of commercial nitrogen, MN is the nitrogen generated
-from manure, FN is the nitrogen fixed by soybean crop, and GN is the nitrogen present in
-harvested grain.
-
-CN = Nrate [kg/ha]
-
-FN = (81.1*x2-98.5)Asoy/AP [kg/ha]
-
-GN = (x1*(1.18/100)*Acorn + x2(6.4/100)*Asoy)/AH [kg/ha]
-
-MNlivestockgroup = P*Nm*LF
-MN = MNhogs + MNbeef + MNmilk + MNother)/AP [kg/ha]
-
-Variables:
-Nrate = Commercial fertilizer in lb N/ac
-x1 = CGY in [tons per hectare]
-x2 = SY in [tons per hectare]
-Asoy = SP [acres]
-Acorn = CP [acres]
-AP = SP + CP [acres]
-AH = SH + CH [acres]
-P = livestock group population [heads]
-Nm = Nitrogen in animal manure [kg/animal/day]
-LF = life cycle of animal [days per year]
-
-
-Output: 
-Ns = N surplus [kg/ha]
-CN = commercial nitrogen applied in planted corn crop (No fertilizer to soybean in Iowa)[kg/ha]
-MN = nitrogen generated from manure[kg/ha]
-FN = nitrogen fixed by soybean crop[kg/ha]
-GN = nitrogen present in harvested grain [kg/ha]
-"""
-# merge only years existing in both dfs
-IFEWs = pd.merge(df_USDA, nrate_gdf, on = ['CountyName', 'Year'], how = 'inner')
-
-# CN 
-IFEWs['CN'] = round(IFEWs["CN_lb/ac"]*1.121, 1)
-
-# MN - Apply the function to create the ManureN_kg_ha field
-IFEWs['MN'] = IFEWs.apply(calculate_manure_n, axis=1)
-
-# FN - Apply the function to create the ManureN_kg_ha field
-IFEWs['FN'] = IFEWs.apply(calculate_fix_n, axis=1)
-
-# GN - Apply the function to create the ManureN_kg_ha field
-IFEWs['GN'] = IFEWs.apply(calculate_grain_n, axis=1)
-
-# Ns - Apply the function to create the ManureN_kg_ha field
-IFEWs['NS'] = IFEWs.apply(calculate_ns, axis=1)
\ No newline at end of file
+from caopeiyu_nrate import nrate_iowa_counties, nrate_versions
+from ns_store import NsStore
+from ifews_schema import enforce_schema
+
+if __name__ == '__main__':
+    # Get data
+    os.chdir(r'C:\Users\jbrittes\Documents\Research\IFEWs_model_v3_1\data')
+
+    # Year-partitioned output store and update mode
+    store = NsStore(os.path.join(os.getcwd(), 'Ns database'))
+    INCREMENTAL = os.getenv('IFEWS_INCREMENTAL', '0') == '1' and len(store.years()) > 0
+    REVISION_YEARS = int(os.getenv('IFEWS_REVISION_YEARS', 2))
+    # first year that may be new or revised by USDA (None = fetch everything)
+    revise_from = max(store.years()) - REVISION_YEARS + 1 if INCREMENTAL else None
+
+    # Define animal and crop parameters
+    animal_parameters = [hogs, hogs_others, beef, milk, other_cattle, on_feed]
+    crop_parameters = [corng_y, corng_pa, corng_ha, soy_y, soy_pa, soy_ha]
+
+    # Process animal and crop data
+    animal_df = process_data_animal(animal_parameters, revise_from=revise_from)
+    crop_df = process_data_crop(crop_parameters, revise_from=revise_from)
+
+    animal_df.rename(columns={'county_name': "CountyName", 'year':'Year'
+                }, inplace=True)
+    crop_df.rename(columns={'county_name': "CountyName", 'year':'Year'
+                }, inplace=True)
+    # OTHER (COMBINED) COUNTIES (county code 998) are excluded by the queries
+
+    # ---------------------Validation - Yearly values for Iowa from USDA ----------------------
+    crop_val = cp()
+    animal_val = ap()
+
+    # expanded - expand so both final df has the same amount of years
+    animal_df = expand_df(df = animal_df, validation_df = crop_val)
+    crop_df = expand_df(df = crop_df, validation_df = crop_val)
+
+    # numeric
+    cols = [ i for i in animal_df.columns if i not in ['CountyName', 'Year']]
+    for col in cols:
+        animal_df[col] = pd.to_numeric(animal_df[col])
+
+    cols = [ i for i in crop_df.columns if i not in ['CountyName', 'Year']]
+    for col in cols:
+        crop_df[col] = pd.to_numeric(crop_df[col])
+
+
+    animal_ifews = enforce_schema(refine_animal_data(animal_df, animal_val))
+    crops_ifews = enforce_schema(interpolation(crop_df))
+
+    #--------------- merge USDA data ---------------------------------------------------
+    df_USDA = pd.merge(animal_ifews, crops_ifews, on=['CountyName', 'Year'], how='left')
+
+    # ---------------------- N fetilizer to Counties (Peiyu Cao) ------------------------------
+    parent_dir = os.getcwd()
+    versions = nrate_versions(parent_dir)
+    stored_years = [y for y in store.years() if store.source(y, 'nrate') == versions.get(y)] if INCREMENTAL else []
+    if stored_years:
+        # unchanged years are taken from the store, only the N rate of new or changed years is read
+        stored = store.read(stored_years, typed=False)
+        nrate_cols = [c for c in stored.columns if c not in df_USDA.columns and c not in ['CN', 'MN', 'FN', 'GN', 'NS']]
+        nrate_dfs = [stored[['CountyName', 'Year'] + nrate_cols]]
+        new_years = [y for y in versions if y not in stored_years]
+        if new_years:
+            nrate_dfs.append(nrate_iowa_counties(parent_dir, years=new_years))
+        nrate_gdf = pd.concat(nrate_dfs, ignore_index=True)
+    else:
+        nrate_gdf = nrate_iowa_counties(parent_dir)
+    # the database is stored without the pixel counts of the county means
+    nrate_gdf = nrate_gdf.drop(columns='pixel_count', errors='ignore')
+
+    # ---------------------- Merge USDA and Nrate data ----------------------------------------
+    """
+    This section calculates the surplus based on Vishal's work:
+    The below modeling addresses the agricutlure and water (nitrogen surplus as a water
+    quality indicador) of the IFEWs.
+    The calculation of nitrogen surplus (Ns) is based on the construction of a rough agronomic
+    annual nitrogen budget (Blesh and Drinkwater, 2013; Jones et al., 2019a) given as:
+
+    Ns = CN + MN + FN - GN
+
+    where CN is the input from the application of commercial nitrogen, MN is the nitrogen generated
+    from manure, FN is the nitrogen fixed by soybean crop, and GN is the nitrogen present in
+    harvested grain.
+
+    CN = Nrate [kg/ha]
+
+    FN = (81.1*x2-98.5)Asoy/AP [kg/ha]
+
+    GN = (x1*(1.18/100)*Acorn + x2(6.4/100)*Asoy)/AH [kg/ha]
+
+    MNlivestockgroup = P*Nm*LF
+    MN = MNhogs + MNbeef + MNmilk + MNother)/AP [kg/ha]
+
+    Variables:
+    Nrate = Commercial fertilizer in lb N/ac
+    x1 = CGY in [tons per hectare]
+    x2 = SY in [tons per hectare]
+    Asoy = SP [acres]
+    Acorn = CP [acres]
+    AP = SP + CP [acres]
+    AH = SH + CH [acres]
+    P = livestock group population [heads]
+    Nm = Nitrogen in animal manure [kg/animal/day]
+    LF = life cycle of animal [days per year]
+
+
+    Output: 
+    Ns = N surplus [kg/ha]
+    CN = commercial nitrogen applied in planted corn crop (No fertilizer to soybean in Iowa)[kg/ha]
+    MN = nitrogen generated from manure[kg/ha]
+    FN = nitrogen fixed by soybean crop[kg/ha]
+    GN = nitrogen present in harvested grain [kg/ha]
+    """
+    # merge only years existing in both dfs
+    IFEWs = pd.merge(df_USDA, nrate_gdf, on = ['CountyName', 'Year'], how = 'inner')
+
+    # only the years whose inputs are new or changed are (re)computed
+    inputs = IFEWs
+    changed_years = store.changed_years(inputs) if INCREMENTAL else sorted(inputs['Year'].unique())
+    IFEWs = inputs[inputs['Year'].isin(changed_years)].copy()
+
+    # CN 
+    IFEWs['CN'] = round(IFEWs["CN_lb/ac"]*1.121, 1)
+
+    # MN - column-wise, all county-years at once
+    IFEWs['MN'] = calculate_manure_n(IFEWs)
+
+    # FN
+    IFEWs['FN'] = calculate_fix_n(IFEWs)
+
+    # GN
+    IFEWs['GN'] = calculate_grain_n(IFEWs)
+
+    # Ns
+    IFEWs['NS'] = calculate_ns(IFEWs)
+
+    # ---------------------- Store the (re)computed years -------------------------------------
+    # stored in full precision, read back with the ifews_schema types
+    for year, rows in IFEWs.groupby('Year'):
+        store.write(year, rows, inputs[inputs['Year'] == year], sources={'nrate': versions.get(year)})
+
+    IFEWs = store.read()
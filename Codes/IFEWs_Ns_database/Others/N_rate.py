@@ -16,6 +16,9 @@
 # In[76]:
 
 
+import sys
+sys.path.append('..')  # IFEWs_Ns_database (this notebook runs in Others)
+from rounding import round_values
 import matplotlib.pyplot as plt
 import seaborn as sns
 import numpy as np
@@ -1039,21 +1042,25 @@ IFEWs['CN'] = round(IFEWs["CN_lb/ac"]*1.121, 1)
 # In[117]:
 
 
-# Define the function to calculate ManureN_kg_ha for each row
-def calculate_manure_n(row):
-    hogs = row['Hogs']
-    milk_cows = row['Milk Cattle']
-    beef_cows = row['Beef Cattle']
-    other_cattle = row['Other Cattle']
-    soybeans_acres = row['SAP']
-    corn_acres = row['CAP']
+# Define the function to calculate ManureN_kg_ha for all rows (column-wise)
+# values are rounded as round() does, with rounding.round_values of the database
+def round_1(values):
+    return pd.Series(round_values(values, 1), index=values.index)
+
+def calculate_manure_n(df):
+    hogs = df['Hogs']
+    milk_cows = df['Milk Cattle']
+    beef_cows = df['Beef Cattle']
+    other_cattle = df['Other Cattle']
+    soybeans_acres = df['SAP']
+    corn_acres = df['CAP']
     
     manure_n = (hogs * 0.027 * 365 + milk_cows * 0.204 * 365 + beef_cows * 0.15 * 365 + other_cattle * 0.5 * 0.1455 * 365 + other_cattle * 0.5 * 0.104 * 170) / (0.404686 * (soybeans_acres + corn_acres))
     
-    return round(manure_n, 1)
+    return round_1(manure_n)
 
 # Apply the function to create the ManureN_kg_ha field
-IFEWs['MN'] = IFEWs.apply(calculate_manure_n, axis=1)
+IFEWs['MN'] = calculate_manure_n(IFEWs)
 
 
 # #### Grain Nitrogen in kg/ha
@@ -1061,18 +1068,18 @@ IFEWs['MN'] = IFEWs.apply(calculate_manure_n, axis=1)
 # In[118]:
 
 
-def calculate_grain_n(row):
-    soybeans_yield = row['SY']
-    corn_yield = row['CGY']
-    soybeans_acres_h = row['SH']
-    corn_acres_h = row['CGH']
+def calculate_grain_n(df):
+    soybeans_yield = df['SY']
+    corn_yield = df['CGY']
+    soybeans_acres_h = df['SH']
+    corn_acres_h = df['CGH']
     
     grain_n = ((soybeans_yield*67.25)*(6.4/100)*(soybeans_acres_h*0.404686)+(corn_yield*62.77)*(1.18/100)*corn_acres_h*0.404686)/(0.404686*(soybeans_acres_h+corn_acres_h))
     
-    return round(grain_n, 1)
+    return round_1(grain_n)
 
 # Apply the function to create the ManureN_kg_ha field
-IFEWs['GN'] = IFEWs.apply(calculate_grain_n, axis=1)
+IFEWs['GN'] = calculate_grain_n(IFEWs)
 
 
 # #### Fixation Nitrogen in kg/ha
@@ -1083,17 +1090,17 @@ IFEWs['GN'] = IFEWs.apply(calculate_grain_n, axis=1)
 # In[119]:
 
 
-def calculate_fix_n(row):
-    soybeans_yield = row['SY']
-    soybeans_acres = row['SAP']
-    corn_acres = row['CAP']
+def calculate_fix_n(df):
+    soybeans_yield = df['SY']
+    soybeans_acres = df['SAP']
+    corn_acres = df['CAP']
     
     fix_n = ((soybeans_yield/15)*81.1-98.5)*(soybeans_acres/(soybeans_acres+corn_acres))
     
-    return round(fix_n, 1)
+    return round_1(fix_n)
 
 # Apply the function to create the ManureN_kg_ha field
-IFEWs['FN'] = IFEWs.apply(calculate_fix_n, axis=1)
+IFEWs['FN'] = calculate_fix_n(IFEWs)
 
 
 # ### Nitrogen Surplus
@@ -1102,18 +1109,18 @@ IFEWs['FN'] = IFEWs.apply(calculate_fix_n, axis=1)
 # In[120]:
 
 
-def calculate_ns(row):
-    commercial = row['CN']
-    manure = row['MN']
-    grain = row['GN']
-    fix = row['FN']
+def calculate_ns(df):
+    commercial = df['CN']
+    manure = df['MN']
+    grain = df['GN']
+    fix = df['FN']
     
     ns = commercial + manure + fix - grain
     
-    return round(ns, 1)
+    return round_1(ns)
 
 # Apply the function to create the ManureN_kg_ha field
-IFEWs['NS'] = IFEWs.apply(calculate_ns, axis=1)
+IFEWs['NS'] = calculate_ns(IFEWs)
 
 
 # In[121]:
@@ -1,26 +1,256 @@
 from dotenv import load_dotenv
 import os
-import urllib.request
+import json
+import time
+import hashlib
+import glob
+import urllib.parse
+from dataclasses import replace
+from functools import partial
 import pandas as pd
-from io import StringIO
+import http_fetch
+from quickstats_query import MAX_ROWS
 load_dotenv()
 API_key = os.getenv('API_KEY')
 
+# Local cache of the QuickStats responses
+# USDA_CACHE_DIR = cache directory (default: usda_cache in the working directory)
+# USDA_CACHE_TTL = seconds a cached response is used without asking the server (default: 30 days)
+# USDA_OFFLINE   = 1 to only use the cache (no network), e.g. with a fixture directory
+# USDA_REFRESH   = 1 to download everything again (and update the cache)
+CACHE_DIR = os.getenv('USDA_CACHE_DIR', 'usda_cache')
+CACHE_TTL = float(os.getenv('USDA_CACHE_TTL', 30 * 24 * 3600))
+OFFLINE = os.getenv('USDA_OFFLINE', '0') == '1'
+REFRESH = os.getenv('USDA_REFRESH', '0') == '1'
+
+# Columns used by the database and their types - the rest of the response is not parsed
+# (Value stays text: it holds thousands separators and codes such as (D))
+COLUMNS = {'county_name': str, 'year': 'int64', 'Value': str,
+           'short_desc': str, 'domain_desc': str, 'class_desc': str}
+
+def _filters(parameters):
+    # parameters of a parameter string without the year range
+    return sorted((k, v) for k, v in urllib.parse.parse_qsl(parameters) if k not in ('year__GE', 'year__LE'))
+
 class c_usda_quick_stats:
 
-    def __init__(self):
+    def __init__(self, cache_dir=None, ttl=None, offline=None, refresh=None):
         # Set the USDA QuickStats API key and API base URL.
         self.api_key = API_key
-        self.base_url_api_get = 'http://quickstats.nass.usda.gov/api/api_GET/?key=' + self.api_key + '&'
+        self.base_url_api_get = 'http://quickstats.nass.usda.gov/api/api_GET/?key=' + (self.api_key or '') + '&'
+        self.base_url_api_counts = 'http://quickstats.nass.usda.gov/api/get_counts/?key=' + (self.api_key or '') + '&'
+
+        # Cache settings - refresh=True always downloads (and updates the cache)
+        self.cache_dir = CACHE_DIR if cache_dir is None else cache_dir
+        self.ttl = CACHE_TTL if ttl is None else ttl
+        self.offline = OFFLINE if offline is None else offline
+        self.refresh = REFRESH if refresh is None else refresh
+
+    def cache_path(self, parameters):
+        # Content-addressed cache file (without extension) of a parameter string
+        key = hashlib.sha256(parameters.encode('utf-8')).hexdigest()
+        return os.path.join(self.cache_dir, key)
+
+    def is_fresh(self, parameters, ttl=None):
+        # True if the cached response of the parameters is used without asking the server
+        ttl = self.ttl if ttl is None else ttl
+        path = self.cache_path(parameters)
+        if not (os.path.exists(path + '.csv') and os.path.exists(path + '.json')):
+            return False
+        if self.offline:
+            return True
+        with open(path + '.json') as f:
+            meta = json.load(f)
+        return not self.refresh and time.time() - meta['fetched'] < ttl
+
+    def fetch(self, parameters, refresh=None, ttl=None):
+        # Return the path of the CSV response for the parameters, downloading it
+        # only if it is not cached, expired (and changed on the server) or refresh is set.
+        return self._fetch(parameters, self.base_url_api_get + parameters, {'parameters': parameters},
+                           refresh, ttl)
+
+    def fetch_url(self, url, refresh=None, ttl=None):
+        # Same as fetch for a CSV file at any URL (e.g. the state series of ap() / cp()), cached by URL.
+        return self._fetch(url, url, {'url': url}, refresh, ttl)
+
+    def _fetch(self, key, url, source, refresh=None, ttl=None):
+        # key = cache key, source = what the response is (stored in its metadata)
+        refresh = self.refresh if refresh is None else refresh
+        ttl = self.ttl if ttl is None else ttl
+        path = self.cache_path(key)
+        csv_file, meta_file = path + '.csv', path + '.json'
+
+        meta = None
+        if os.path.exists(csv_file) and os.path.exists(meta_file):
+            with open(meta_file) as f:
+                meta = json.load(f)
+
+        if self.offline:
+            if meta is None:
+                raise FileNotFoundError('No cached response for: ' + key)
+            return csv_file
+
+        if meta is not None and not refresh and time.time() - meta['fetched'] < ttl:
+            return csv_file
+
+        # Call the api_GET API with the specified parameters (or the URL).
+        # Revalidate an expired response with its ETag / Last-Modified.
+        headers = {}
+        if meta is not None and not refresh:
+            if meta.get('etag'):
+                headers['If-None-Match'] = meta['etag']
+            if meta.get('last_modified'):
+                headers['If-Modified-Since'] = meta['last_modified']
+
+        s_result = http_fetch.get(url, headers=headers, stream=True)
+        if s_result.status_code == 304:
+            # not modified - keep the cached response
+            meta['fetched'] = time.time()
+            self._write_meta(meta_file, meta)
+            return csv_file
+
+        os.makedirs(self.cache_dir, exist_ok=True)
+        tmp = csv_file + '.tmp'
+        with open(tmp, 'wb') as o_file:
+            # streamed to disk in blocks, the response is never held in memory
+            for block in s_result.iter_content(chunk_size=1 << 20):
+                o_file.write(block)
+        os.replace(tmp, csv_file)
+
+        meta = dict(source, fetched=time.time(),
+                    etag=s_result.headers.get('ETag'),
+                    last_modified=s_result.headers.get('Last-Modified'))
+        self._write_meta(meta_file, meta)
+        return csv_file
+
+    def _write_meta(self, meta_file, meta):
+        tmp = meta_file + '.tmp'
+        with open(tmp, 'w') as f:
+            json.dump(meta, f)
+        os.replace(tmp, meta_file)
+
+    def seed_cache(self, query):
+        # Cache the response of a query from the cached responses of the same filters over other
+        # year ranges (e.g. the full query cached before the first incremental update), taking
+        # every year from the newest response that has it. True if all its years were cached.
+        parameters = query.encode()
+        if self.refresh or os.path.exists(self.cache_path(parameters) + '.json'):
+            return False
+
+        filters = _filters(parameters)
+        sources = []
+        for meta_file in glob.glob(os.path.join(self.cache_dir, '*.json')):
+            csv_file = meta_file[:-len('.json')] + '.csv'
+            if meta_file.endswith('.count.json') or not os.path.exists(csv_file):
+                continue
+            with open(meta_file) as f:
+                meta = json.load(f)
+            if 'parameters' not in meta or _filters(meta['parameters']) != filters:
+                continue
+            years = dict(urllib.parse.parse_qsl(meta['parameters']))
+            first = int(years['year__GE'])
+            last = int(years.get('year__LE', time.localtime(meta['fetched']).tm_year))
+            sources.append((meta['fetched'], first, last, csv_file))
+        sources.sort(reverse=True)
+
+        chosen = {}
+        for year in range(query.year_ge, query.last_year() + 1):
+            source = next((s for s in sources if s[1] <= year <= s[2]), None)
+            if source is None:
+                return False
+            chosen.setdefault(source, []).append(year)
+
+        frames = []
+        for (fetched, first, last, csv_file), years in chosen.items():
+            df = pd.read_csv(csv_file, encoding='utf-8', dtype=str, keep_default_na=False)
+            frames.append(df[df['year'].astype(int).isin(years)])
+        csv_file, meta_file = self.cache_path(parameters) + '.csv', self.cache_path(parameters) + '.json'
+        tmp = csv_file + '.tmp'
+        pd.concat(frames, ignore_index=True).to_csv(tmp, index=False, encoding='utf-8')
+        os.replace(tmp, csv_file)
+        self._write_meta(meta_file, {'parameters': parameters, 'fetched': min(s[0] for s in chosen),
+                                     'etag': None, 'last_modified': None})
+        return True
+
+    def get_data(self, parameters, refresh=None, columns=COLUMNS, ttl=None):
+        # Retrieve the data from the cache or the Quick Stats server.
+        csv_file = self.fetch(parameters, refresh=refresh, ttl=ttl)
+        return self._read(csv_file, columns)
+
+    def get_url_data(self, url, refresh=None, columns=None, ttl=None):
+        # Retrieve a CSV file at any URL from the cache or its server.
+        return self._read(self.fetch_url(url, refresh=refresh, ttl=ttl), columns)
+
+    def _read(self, csv_file, columns):
+        # Parse the CSV data into a DataFrame, only the given columns (dict of dtypes, None = all).
+        if columns is None:
+            df = pd.read_csv(csv_file, encoding='utf-8')
+        else:
+            df = pd.read_csv(csv_file, encoding='utf-8', usecols=lambda c: c in columns,
+                             dtype=columns)
+
+        return df
+
+    def get_data_many(self, parameters_list):
+        # Retrieve several parameter strings concurrently, DataFrames in the same order.
+        return http_fetch.map_ordered(self.get_data, parameters_list)
+
+    def get_count(self, parameters, ttl=None):
+        # Number of records of the parameters (get_counts API), cached like the responses.
+        ttl = self.ttl if ttl is None else ttl
+        count_file = self.cache_path(parameters) + '.count.json'
+        if os.path.exists(count_file):
+            with open(count_file) as f:
+                meta = json.load(f)
+            if self.offline or (not self.refresh and time.time() - meta['fetched'] < ttl):
+                return meta['count']
+        if self.offline:
+            raise FileNotFoundError('No cached QuickStats count for: ' + parameters)
+
+        count = int(http_fetch.get(self.base_url_api_counts + parameters).json()['count'])
+        os.makedirs(self.cache_dir, exist_ok=True)
+        self._write_meta(count_file, {'parameters': parameters, 'fetched': time.time(), 'count': count})
+        return count
 
-    def get_data(self, parameters):
-        # Call the api_GET API with the specified parameters.
-        # Retrieve the data from the Quick Stats server.
-        full_url = self.base_url_api_get + parameters
-        s_result = urllib.request.urlopen(full_url)
-        s_text = s_result.read().decode('utf-8')
+    def get_query(self, query, revise_from=None):
+        # Retrieve a QuickStats query (quickstats_query.QuickStatsQuery) as one DataFrame.
+        # Multi-valued filters are sent as one request per value and queries above
+        # the MAX_ROWS cap of the API are split by year range.
+        # revise_from = first year that may be new or revised: the years before are
+        # read from the cache whatever its age, the years from revise_from on are
+        # always revalidated with the server. The years before revise_from are taken
+        # from the cached responses of other year ranges when possible (seed_cache).
+        parts = []
+        for q in query.split_values():
+            if revise_from is None:
+                parts.append((q, None))
+                continue
+            if q.year_ge < revise_from:
+                year_le = revise_from - 1 if q.year_le is None else min(q.year_le, revise_from - 1)
+                old = replace(q, year_le=year_le)
+                self.seed_cache(old)
+                parts.append((old, float('inf')))
+            if q.last_year() >= revise_from:
+                parts.append((replace(q, year_ge=max(q.year_ge, revise_from)), 0))
+        frames = [self._get_capped(q, ttl) for q, ttl in parts]
+        return frames[0] if len(frames) == 1 else pd.concat(frames, ignore_index=True)
 
-        # Parse the CSV data into a DataFrame.
-        df = pd.read_csv(StringIO(s_text))
+    def _get_capped(self, query, ttl=None):
+        parameters = query.encode()
+        # a cached response is below the cap, no need to count it
+        if self.is_fresh(parameters, ttl=ttl):
+            return self.get_data(parameters, ttl=ttl)
+        count = self.get_count(parameters, ttl=ttl)
+        if count == 0:
+            # the API answers a query without records with an error
+            return pd.DataFrame({col: pd.Series(dtype=dtype) for col, dtype in COLUMNS.items()})
+        if count <= MAX_ROWS:
+            return self.get_data(parameters, ttl=ttl)
+        if query.year_ge >= query.last_year():
+            raise ValueError('{} has {} records in {}, more than the {} rows the API returns'
+                             .format(query.name, count, query.year_ge, MAX_ROWS))
+        return pd.concat([self._get_capped(q, ttl) for q in query.split_years()], ignore_index=True)
 
-        return df    
\ No newline at end of file
+    def get_query_many(self, queries, revise_from=None):
+        # Retrieve several queries concurrently, DataFrames in the same order.
+        return http_fetch.map_ordered(partial(self.get_query, revise_from=revise_from), queries)
@@ -1,134 +1,291 @@
 
 import os
+import re
 # Get data
 os.chdir(r'C:\Users\jbrittes\Documents\Research\IFEWs_model_v3_1\data')
 # Import necessary libraries
+import math
+import hashlib
+import warnings
+from concurrent.futures import ProcessPoolExecutor
 import numpy as np
-from shapely.geometry import mapping
-import rioxarray as rxr
-import geopandas as gpd
-import rasterio
-from rasterstats import zonal_stats
 import pandas as pd
+try:
+    # only needed to extract the N rate from the rasters (nrate_original),
+    # the county N rate table is read without them
+    import geopandas as gpd
+    import rasterio
+    from rasterio.features import rasterize
+    from rasterio.windows import Window, from_bounds
+except ImportError:
+    gpd = rasterio = None
+try:
+    # only needed for the pixel N rate cube
+    import xarray as xr
+    import rioxarray  # registers the .rio accessor of xarray
+except ImportError:
+    xr = None
+
+# County N rate of all years: one table (Parquet) of the county attributes, Year,
+# CN_lb/ac and pixel_count (pixels averaged) and one file of the county geometries
+NRATE_TABLE = 'Nrate_counties.parquet'
+NRATE_GEOMETRY = 'Nrate_counties.gpkg'
+# Pixel N rate of all years: (year, y, x) cube of the Iowa windows (Zarr, compressed
+# chunks of CUBE_CHUNK (years, rows, columns))
+NRATE_CUBE = 'Nrate_cube.zarr'
+CUBE_CHUNK = (1, 256, 256)
+# no data value of the fertilizer rasters
+NODATA = -999
 
 # ------------------- Cao Peiyu -----------------------------------------------------
-# get original data from Peiyu File - raster to points and aggregate to counties
+# get original data from Peiyu File - aggregate the rasters to counties
+# The annual rasters cover the conterminous US, only the window around Iowa is read.
+
+def iowa_window(src, iowa):
+    # pixel window of the open raster src covering the Iowa counties (whole pixels, inside the raster)
+    left, bottom, right, top = iowa.to_crs(src.crs).total_bounds
+    window = from_bounds(left, bottom, right, top, transform=src.transform)
+    col_off, row_off = math.floor(window.col_off), math.floor(window.row_off)
+    width = math.ceil(window.col_off + window.width) - col_off
+    height = math.ceil(window.row_off + window.height) - row_off
+    return Window(col_off, row_off, width, height).intersection(Window(0, 0, src.width, src.height))
+
+def county_labels(iowa, shape, transform, crs):
+    # label raster of the counties on a grid: row of iowa of the county of each pixel,
+    # -1 outside Iowa (a pixel belongs to a county if its centre is inside, as in zonal_stats)
+    shapes = zip(iowa.to_crs(crs).geometry, range(len(iowa)))
+    return rasterize(shapes, out_shape=shape, transform=transform, fill=-1, dtype='int32')
+
+def cached_county_labels(iowa, shape, transform, crs, cache_file, source):
+    # county_labels, kept in cache_file while the boundary file (source) and the grid do not change
+    key = np.array([str(source), str(tuple(shape)), str(tuple(transform)), str(crs)])
+    if os.path.exists(cache_file):
+        with np.load(cache_file) as data:
+            if np.array_equal(data['key'], key):
+                return data['labels']
+    labels = county_labels(iowa, shape, transform, crs)
+    with open(cache_file, 'wb') as f:
+        np.savez_compressed(f, labels=labels, key=key)
+    return labels
+
+def zonal_stats_stack(stack, labels, n):
+    # mean, std and pixel count of every county (0..n-1 of labels) in every layer of
+    # a (year, y, x) stack, NaN = no data. Arrays of shape (year, n), mean/std NaN without pixels.
+    valid = ~np.isnan(stack) & (labels >= 0)
+    layer = np.broadcast_to(np.arange(stack.shape[0])[:, None, None], stack.shape)
+    index = (layer * n + labels)[valid]
+    values = stack[valid].astype('float64')
+    size = stack.shape[0] * n
+
+    count = np.bincount(index, minlength=size)
+    with np.errstate(invalid='ignore', divide='ignore'):
+        mean = np.bincount(index, weights=values, minlength=size) / count
+        var = np.bincount(index, weights=(values - mean[index]) ** 2, minlength=size) / count
+    shape = (stack.shape[0], n)
+    return mean.reshape(shape), np.sqrt(var).reshape(shape), count.reshape(shape)
+
+def write_nrate_cube(path, stack, years, transform, crs):
+    # (year, y, x) cube of the stacked Iowa windows, with the grid (crs, transform) of rioxarray
+    height, width = stack.shape[1:]
+    cube = xr.DataArray(stack, dims=('year', 'y', 'x'), name='nrate', attrs={'units': 'lb N/ac'},
+                        coords={'year': years,
+                                'y': transform.f + (np.arange(height) + 0.5) * transform.e,
+                                'x': transform.c + (np.arange(width) + 0.5) * transform.a})
+    cube = cube.rio.write_crs(crs).rio.write_transform(transform)
+    chunks = tuple(min(c, n) for c, n in zip(CUBE_CHUNK, stack.shape))
+    cube.to_dataset().to_zarr(path, mode='w', encoding={'nrate': {'chunks': chunks}})
+
+# Year of an annual raster from its file name (None if it has no year)
+def raster_year(file):
+    match = re.search(r'(?<!\d)(1[89]\d\d|20\d\d)(?!\d)', file)
+    return int(match.group(1)) if match else None
+
+# Process pool workers: the county boundary is sent once to each worker,
+# the Iowa window is computed once per raster grid.
+_boundary = None
+_windows = {}
+
+def _init_worker(boundary):
+    global _boundary
+    _boundary = boundary
+
+def read_iowa_layer(f):
+    # Iowa window of the raster file f: (grid key, window transform, crs, layer with nodata and NODATA as NaN)
+    with rasterio.open(f) as src:
+        key = (str(src.crs), tuple(src.transform), src.width, src.height)
+        if key not in _windows:
+            _windows[key] = iowa_window(src, _boundary)
+        window = _windows[key]
+        data = src.read(1, window=window, masked=True)
+        layer = data.astype(np.result_type(data.dtype, np.float32)).filled(np.nan)
+        # -999 is no data also where the file declares another nodata value
+        layer[layer == NODATA] = np.nan
+        return key, src.window_transform(window), src.crs, layer
+
 # path
-def nrate_original(parent_dir):
+# max_workers = processes reading the rasters (default 1: read in this process, no pool;
+# None: number of CPUs). With a pool the calling script needs an
+# if __name__ == '__main__': guard (the workers import it again on Windows).
+def nrate_original(parent_dir, max_workers=1):
     dir_name1 = parent_dir + "\\N fertilizer maps US from 2022\\"
 
     files = os.listdir(dir_name1)
 
     # select only files containing years of interest. And as .tif
     # remove folder N fertilizer data
-    files = [x for x in files if "N fertilizer data" not in x]
+    files = [x for x in files if "N fertilizer data" not in x and x.lower().endswith((".tif", ".tiff"))]
 
-    # remove unwanted years
-    y = [i for i in range(1900,1968,1)]
-    y = [str(x) for x in y]
-    for i in range(len(y)):
-        files = [x for x in files if y[i] not in x]
+    # remove unwanted years - the year of a raster is taken from its file name
+    files = sorted((x for x in files if (raster_year(x) or 0) >= 1968), key=raster_year)
+    years = [raster_year(x) for x in files]
+    if len(set(years)) != len(years):
+        raise ValueError('More than one raster of a year: ' + ', '.join(files))
+    if not files:
+        raise FileNotFoundError('No N fertilizer raster of 1968 or later in ' + dir_name1)
 
-    # Get boundary data
+    # Get boundary data (crop extent - your study area extent boundary)
     file_boundary = os.path.join(parent_dir, "Iowa Counties", 'IowaCounties.shp')
+    boundary = gpd.read_file(file_boundary)
+
+    stat = os.stat(file_boundary)
+    source = (stat.st_size, stat.st_mtime_ns)
+    labels_file = os.path.join(parent_dir, "N fertilizer maps US from 2022", 'N fertilizer data_Iowa',
+                               'county_labels.npz')
+
+    # Read only the Iowa window of every raster (nodata as NaN), on a process pool if max_workers > 1,
+    # grouped by raster grid - the county labels are computed once per grid (all years share one grid)
+    paths = [os.path.join(dir_name1, file) for file in files]
+    grids = {}
+    def collect(layers):
+        for file, (key, transform, crs, layer) in zip(files, layers):
+            grid = grids.setdefault(key, {'transform': transform, 'crs': crs, 'years': [], 'layers': []})
+            grid['years'].append(raster_year(file))
+            grid['layers'].append(layer)
+
+    if max_workers == 1:
+        _init_worker(boundary)
+        collect(map(read_iowa_layer, paths))
+    else:
+        with ProcessPoolExecutor(max_workers=max_workers, initializer=_init_worker,
+                                 initargs=(boundary,)) as pool:
+            collect(pool.map(read_iowa_layer, paths))
 
-    for idx, file in enumerate(files):
-        # Open crop extent (your study area extent boundary)
-        iowa = gpd.read_file(file_boundary)
-        
-        year = 1968 + idx
-        f = os.path.join(dir_name1, file)
-        # Open rasters
-        fertilizer_im = rxr.open_rasterio(f, masked=True).squeeze()
-        # Clip data
-        nrate_clipped = fertilizer_im.rio.clip(iowa.geometry.apply(mapping),
-                                        # This is needed if your GDF is in a diff CRS than the raster data
-                                        iowa.crs)
-        # export new data
-        path_to_tif_file = os.path.join(parent_dir,
-                                        "N fertilizer maps US from 2022",'N fertilizer data_Iowa', 
-                                        file)
-
-        # Write the data to a new geotiff file
-        nrate_clipped.rio.to_raster(path_to_tif_file)
-        
-        # Convert the raster dataset to a point shapefile using rasterio
-        with rasterio.open(path_to_tif_file) as src:
-            data = src.read(1, masked=True)
-            if not data.mask.all():
-                meta = src.meta
-                points = np.where(data.mask == False)
-                if len(points) == 1:
-                    lon, lat = src.xy(points[0], np.zeros_like(points[0]))
-                else:
-                    lon, lat = src.xy(points[0], points[1])
-                df = pd.DataFrame({'Longitude': lon, 'Latitude': lat})
-                geometry = gpd.points_from_xy(df.Longitude, df.Latitude)
-                crs = src.crs
-                point_gdf = gpd.GeoDataFrame(df, crs=crs, geometry=geometry)
-        
-        iowa1 = iowa.to_crs(fertilizer_im.rio.crs)
-        # Compute mean values of raster dataset in polygons of Iowa shapefile - shoud output 99 values (one for each county)
-        stats = zonal_stats(iowa1, path_to_tif_file, stats='mean', nodata=-999)
-        mean_vals = [feature['mean'] for feature in stats]
-        iowa['CN_lb/ac'] = mean_vals
-        
-        # Add year column
-        iowa['date'] = year
-
-        # Change CRS to UTM zone 15N
-        iowa_utm = iowa.to_crs(epsg=26915)
-
-        #clean shapefiles
-        iowa = iowa.drop(['FID', 'PERIMETER', 'DOMCountyI',  'FIPS', 'FIPS_INT', 'SHAPE_Leng', 'SHAPE_Area'], axis=1)
-
-        #iowa['CountyName'] = iowa['CountyName'].replace('Obrien', "O brien")
-        #iowa['CountyName'] = iowa['CountyName'].str.upper()
-        
-        # Save the shapefile
-        path_to_shp_file = os.path.join(parent_dir,
-                                        "N fertilizer maps US from 2022",'N fertilizer data_Iowa', 
-                                        f"Nrate_{year}.shp")
-        iowa_utm.to_file(path_to_shp_file)
-
-# --------------- Aggregate Shapefiles in One shapefile (temporal series) ----------------------
-# Read in each shapefile as a separate GeoDataFrame and store them in a list:
+    # county attributes of the table, the geometries are written once
+    attributes = boundary.drop(['FID', 'PERIMETER', 'DOMCountyI',  'FIPS', 'FIPS_INT', 'SHAPE_Leng', 'SHAPE_Area'],
+                               axis=1)
+    dir_name2 = os.path.join(parent_dir, "N fertilizer maps US from 2022", 'N fertilizer data_Iowa')
+
+    tables = []
+    for grid in grids.values():
+        # Compute mean values of the rasters in polygons of Iowa shapefile - 99 values (one for each county) per year
+        stack = grid['stack'] = np.stack(grid.pop('layers'))
+        labels = cached_county_labels(boundary, stack.shape[1:], grid['transform'], grid['crs'],
+                                      labels_file, source)
+        mean, std, count = zonal_stats_stack(stack, labels, len(boundary))
+
+        for year, mean_vals, count_vals in zip(grid['years'], mean, count):
+            table = pd.DataFrame(attributes.drop(columns=attributes.geometry.name))
+            table['Year'] = year
+            table['CN_lb/ac'] = mean_vals
+            table['pixel_count'] = count_vals
+            tables.append(table)
+
+    # the outputs are written here, by this process only
+    if xr is None:
+        warnings.warn('xarray and rioxarray are not installed, the N rate cube is not written')
+    elif len(grids) == 1:
+        (grid,) = grids.values()
+        write_nrate_cube(os.path.join(dir_name2, NRATE_CUBE), grid['stack'], grid['years'], grid['transform'],
+                         grid['crs'])
+    else:
+        warnings.warn('The rasters are on {} different grids, the N rate cube is not written'.format(len(grids)))
+
+    write_nrate_table(dir_name2, pd.concat(tables, ignore_index=True).sort_values(['Year'], kind='stable'))
+
+    # Change CRS to UTM zone 15N
+    attributes.to_crs(epsg=26915).to_file(os.path.join(dir_name2, NRATE_GEOMETRY), driver='GPKG')
+
+# --------------- County N rate of all years (temporal series) ----------------------
 # path
 
-def nrate_iowa_counties(parent_dir):
-    # if more variables available - run nrate_original to update database
-    #nrate_original(parent_dir = parent_dir)
+def write_nrate_table(dir_name2, nrate_df):
+    tmp = os.path.join(dir_name2, NRATE_TABLE + '.tmp')
+    nrate_df.to_parquet(tmp, index=False)
+    os.replace(tmp, os.path.join(dir_name2, NRATE_TABLE))
 
-    dir_name2 = parent_dir + "\\N fertilizer maps US from 2022\\N fertilizer data_Iowa"
-    files = os.listdir(dir_name2)
+def nrate_table_from_shapefiles(dir_name2):
+    # table of the per-year Nrate_YYYY.shp files of earlier versions of nrate_original (None if there are none)
+    files = sorted(x for x in os.listdir(dir_name2) if re.fullmatch(r'Nrate_\d{4}\.shp', x))
+    if not files:
+        return None
+    if gpd is None:
+        raise ImportError('geopandas is needed to convert the Nrate_YYYY.shp files to ' + NRATE_TABLE)
 
-    # select only shapefiles - remove files that are not shp
-    files = [x for x in files if ".shp" in x]
+    nrate_gdf = pd.concat([gpd.read_file(os.path.join(dir_name2, file)) for file in files], ignore_index=True)
+    nrate_gdf['Year'] = nrate_gdf['date'].astype(int)
+    # Drop date column, geometry and all unsuaful columns
+    nrate_gdf = nrate_gdf.drop(['FID', 'PERIMETER', 'DOMCountyI',  'FIPS', 'FIPS_INT', 'SHAPE_Leng', 'SHAPE_Area', 'date',
+                                nrate_gdf.geometry.name], axis=1, errors='ignore')
+    return pd.DataFrame(nrate_gdf)
 
-    filepaths = []
-    for file in files:
-        f = os.path.join(dir_name2, file)
-        filepaths.append(f)
-        
-    gdfs = []
-    for filepath in filepaths:
-        gdf = gpd.read_file(filepath)
-        gdfs.append(gdf)    
+def read_nrate_table(parent_dir, years=None):
+    # table written by nrate_original, only the given years (default all)
+    dir_name2 = parent_dir + "\\N fertilizer maps US from 2022\\N fertilizer data_Iowa"
+    if not os.path.exists(os.path.join(dir_name2, NRATE_TABLE)):
+        # no table yet: convert the shapefiles of an earlier extraction once
+        nrate_df = nrate_table_from_shapefiles(dir_name2)
+        if nrate_df is None:
+            raise FileNotFoundError('No county N rate table or Nrate_YYYY.shp files in ' + dir_name2 +
+                                    ', run nrate_original(parent_dir) first')
+        write_nrate_table(dir_name2, nrate_df)
+    nrate_df = pd.read_parquet(os.path.join(dir_name2, NRATE_TABLE))
+    if years is not None:
+        nrate_df = nrate_df[nrate_df['Year'].isin(years)].reset_index(drop=True)
+    return nrate_df
 
+def open_nrate_cube(parent_dir):
+    # pixel N rate cube written by nrate_original, opened lazily (chunks are read when used)
+    dir_name2 = parent_dir + "\\N fertilizer maps US from 2022\\N fertilizer data_Iowa"
+    return xr.open_zarr(os.path.join(dir_name2, NRATE_CUBE), decode_coords='all')['nrate']
 
-    # Concatenate the list of geodata into a single one
-    nrate_gdf = pd.concat(gdfs, ignore_index=True)
+def polygon_nrate(cube, polygons, years_per_block=8):
+    # mean, std and pixel count of the N rate of the cube in every polygon of a GeoDataFrame
+    # (any CRS, e.g. HUC-8 watersheds or ag districts) and every year. The polygons are
+    # rasterized once and the cube is reduced years_per_block years at a time, so only
+    # those chunks are in memory. DataFrame of the polygon (index of polygons), Year,
+    # mean, std and pixel_count.
+    labels = county_labels(polygons, cube.shape[1:], cube.rio.transform(), cube.rio.crs)
+    n = len(polygons)
+    frames = []
+    for start in range(0, cube.sizes['year'], years_per_block):
+        block = cube.isel(year=slice(start, start + years_per_block))
+        mean, std, count = zonal_stats_stack(block.values, labels, n)
+        years = block['year'].values
+        frames.append(pd.DataFrame({'polygon': np.tile(polygons.index, len(years)),
+                                    'Year': np.repeat(years, n),
+                                    'mean': mean.ravel(), 'std': std.ravel(),
+                                    'pixel_count': count.ravel()}))
+    return pd.concat(frames, ignore_index=True)
 
-    # Extract the year from a column in the GeoDataFrame, and create a new column for the year
-    nrate_gdf['date'] = pd.to_datetime(nrate_gdf['date'], format='%Y')
-    nrate_gdf['Year'] = nrate_gdf['date'].dt.year
+def nrate_versions(parent_dir):
+    # version (fingerprint of the county rows) of the N rate of each year
+    nrate_df = read_nrate_table(parent_dir)
+    versions = {}
+    for year, rows in nrate_df.groupby('Year'):
+        rows = rows.sort_values('CountyName')
+        versions[int(year)] = hashlib.sha256(rows.to_csv(index=False).encode('utf-8')).hexdigest()
+    return versions
+
+# years = only read the N rate of these years (default all)
+def nrate_iowa_counties(parent_dir, years=None):
+    # if more variables available - run nrate_original to update database
+    #nrate_original(parent_dir = parent_dir)
 
-    # Drop date column and all unsuaful columns
-    nrate_gdf = nrate_gdf.drop(['FID', 'PERIMETER', 'DOMCountyI',  'FIPS', 'FIPS_INT', 'SHAPE_Leng', 'SHAPE_Area', 'date'], axis=1)
+    nrate_df = read_nrate_table(parent_dir, years=years)
 
     # Makes column names compatible with USDA data
-    nrate_gdf.rename(columns={"StateAbbr":"State"}, inplace = True)
-    nrate_gdf['CountyName'] = nrate_gdf['CountyName'].replace('Obrien', "O BRIEN")
-    nrate_gdf['CountyName'] = nrate_gdf['CountyName'].str.upper()
+    nrate_df.rename(columns={"StateAbbr":"State"}, inplace = True)
+    nrate_df['CountyName'] = nrate_df['CountyName'].replace('Obrien', "O BRIEN")
+    nrate_df['CountyName'] = nrate_df['CountyName'].str.upper()
 
-    return nrate_gdf
\ No newline at end of file
+    return nrate_df
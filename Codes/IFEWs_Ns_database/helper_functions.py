@@ -1,29 +1,20 @@
 import numpy as np
 import pandas as pd
 from scipy.interpolate import interp1d
+from rounding import round_values
 from c_usda_quick_stats import c_usda_quick_stats
 
 # instance of c_usda_quick_stats
 stats = c_usda_quick_stats()
 
 # function to fetch and process data
-def process_data_crop(parameters):
+# parameters = QuickStatsQuery list (parameters.py), the query name is the column name
+def process_data_crop(parameters, revise_from=None):
     dataframes = []
-    for param in parameters:
-        df = stats.get_data(param)         
-
-        if 'CORN' in param and 'YIELD' in param:
-            name =  "corng_y"
-        elif 'CORN' in param and 'PLANTED' in param:
-            name =  "corng_pa"  
-        elif 'CORN' in param and 'HARVESTED' in param:
-            name =  "corng_ha"  
-        elif 'SOYBEANS' in param and 'YIELD' in param:
-            name =  "soy_y"
-        elif 'SOYBEANS' in param and 'HARVESTED' in param:
-            name =  "soy_ha"
-        else:
-            name =  "soy_pa"
+    # fetch all queries concurrently (revise_from: see c_usda_quick_stats.get_query)
+    fetched = stats.get_query_many(parameters, revise_from=revise_from)
+    for param, df in zip(parameters, fetched):
+        name = param.name
         # pivot table with county_name and year as indices and Value as the data column
         df = df.pivot_table(index=['county_name', 'year'], 
                                 values='Value', 
@@ -43,13 +34,14 @@ def process_data_crop(parameters):
     
     return df
 
-def process_data_animal(parameters):
+# the rows are filtered by the queries (parameters.py), only reshaped here
+def process_data_animal(parameters, revise_from=None):
     dataframes = []
-    for param in parameters:
-        df = stats.get_data(param)
+    # fetch all queries concurrently (revise_from: see c_usda_quick_stats.get_query)
+    fetched = stats.get_query_many(parameters, revise_from=revise_from)
+    for param, df in zip(parameters, fetched):
         
-        if 'CALVES' in param:
-            df = df[df['class_desc'] == 'INCL CALVES']
+        if param.name == 'other_cattle':
             # pivot table with county_name and year as indices and Value as the data column
             df = df.pivot_table(index=['county_name', 'year'], 
                                     values='Value', 
@@ -57,9 +49,7 @@ def process_data_animal(parameters):
 
             df.columns = ['county_name', 'year', 'cattle']
 
-        if 'HOGS' in param and 'BREEDING' not in param:
-            df = df[df['short_desc'] == 'HOGS - INVENTORY']  
-
+        if param.name == 'hogs':
             # pivot table with county_name and year as indices and Value as the data column
             df = df.pivot_table(index=['county_name', 'year'], 
                                     values='Value', 
@@ -67,12 +57,8 @@ def process_data_animal(parameters):
 
             df.columns = ['county_name', 'year', 'hogs']
 
-        if 'BREEDING' in param:  
-            df = df[
-                ((df['short_desc'] == 'HOGS, BREEDING - INVENTORY') | 
-                (df['short_desc'] == 'HOGS - SALES, MEASURED IN HEAD')) & 
-                (df['domain_desc'] == 'TOTAL')
-            ][['county_name', 'year', 'short_desc', 'Value']]
+        if param.name == 'hogs_others':
+            df = df[['county_name', 'year', 'short_desc', 'Value']]
 
             # Use pivot_table to reshape the data
             df = df.pivot_table(
@@ -88,12 +74,8 @@ def process_data_animal(parameters):
                 'HOGS - SALES, MEASURED IN HEAD': 'hogs_sales'
             }, inplace=True)
             
-        if 'SALES' in param:
-            df = df[
-                ((df['short_desc'] == 'CATTLE, ON FEED - INVENTORY') | 
-                (df['short_desc'] == 'CATTLE, ON FEED - SALES FOR SLAUGHTER, MEASURED IN HEAD')) & 
-                (df['domain_desc'] == 'TOTAL')
-            ][['county_name', 'year', 'short_desc', 'Value']]
+        if param.name == 'on_feed':
+            df = df[['county_name', 'year', 'short_desc', 'Value']]
 
             df = df.pivot_table(
                 index=['county_name', 'year'], 
@@ -128,13 +110,8 @@ def process_data_animal(parameters):
         #         'CHICKENS, LAYERS - INVENTORY': 'layers'
         #     }, inplace=True)
         
-        if not any(x in param for x in ['CHICKENS', 'SALES', 'BREEDING', 'HOGS', 'CALVES']):
-            if 'BEEF' in param:
-                name =  "beef"
-            elif 'MILK' in param:
-                name = "milk"
-            # elif 'TURKEYS' in param:
-            #     name = 'turkeys'
+        if param.name in ['beef', 'milk']: # , 'turkeys'
+            name = param.name
 
             # pivot table with county_name and year as indices and Value as the data column
             df = df.pivot_table(index=['county_name', 'year'], 
@@ -158,32 +135,30 @@ def refine_animal_data(animal_df, animal_val):
     animal_nloss = animal_df.copy()
     animal_val_nloss = animal_val.copy()
 
-    # Function to distribute population among all counties proportionally
-    def distribute_population_proportionally(remaining_population, counties_population):
-        if not counties_population:  # Check if counties_population is empty
-            return []
-        
-        total_known_population = sum(counties_population)
-        if total_known_population == 0:
-            equal_distribution = remaining_population / len(counties_population)
-            return [round(equal_distribution)] * len(counties_population)
-        else:
-            proportions = [pop / total_known_population for pop in counties_population]
-            distributed_population = [remaining_population * proportion for proportion in proportions]
-            return [round(pop) for pop in distributed_population]
-    
-    # Function to correct values in animal population data
-    def correct_values(animal_type, df, val_df, interpolated_indices):
-        for year in df['Year'].unique():
-            interpolated_population = df.loc[(df['Year'] == year) & df.index.isin(interpolated_indices), animal_type].tolist()
-            total_interpolated_population = sum(interpolated_population)
-            state_population = val_df.loc[val_df['Year'] == year, animal_type].values[0]
-            total_known_population = df.loc[df['Year'] == year, animal_type].sum()
-
-            if not np.isnan(state_population):
-                remaining_population = max(0, state_population - (total_known_population - total_interpolated_population))
-                corrected_population = distribute_population_proportionally(remaining_population, interpolated_population)
-                df.loc[(df['Year'] == year) & df.index.isin(interpolated_indices), animal_type] = corrected_population
+    # Function to correct the interpolated values of all animal types at once: per year, the
+    # state population minus the population of the counties with data is distributed among
+    # the interpolated counties in proportion to their interpolated values (equally if these
+    # are all 0), rounded to whole animals. Years without state population are not corrected.
+    def correct_values(animal_types, df, val_df, interpolated_indices):
+        year = df['Year']
+        values = df[animal_types].astype(float)
+        interpolated = pd.DataFrame({t: df.index.isin(interpolated_indices[t]) for t in animal_types},
+                                    index=df.index)
+
+        total_interpolated_population = values.where(interpolated, 0).groupby(year).transform('sum')
+        n_interpolated = interpolated.astype(int).groupby(year).transform('sum')
+        total_known_population = values.groupby(year).transform('sum')
+        state_population = val_df.drop_duplicates('Year').set_index('Year')[animal_types] \
+                                 .reindex(year).set_axis(df.index)
+
+        remaining_population = (state_population - (total_known_population - total_interpolated_population)).clip(lower=0)
+        with np.errstate(invalid='ignore', divide='ignore'):
+            distributed_population = np.where(total_interpolated_population == 0,
+                                              remaining_population / n_interpolated,
+                                              remaining_population * (values / total_interpolated_population))
+        corrected_population = pd.DataFrame(np.rint(distributed_population), index=df.index, columns=animal_types)
+
+        df[animal_types] = values.mask(interpolated & state_population.notna(), corrected_population)
     
     # Function to apply linear interpolation to specific columns
     def apply_interpolation(df, columns):
@@ -203,8 +178,7 @@ def refine_animal_data(animal_df, animal_val):
     interpolated_indices = apply_interpolation(animal_nloss, common_animal_types)
 
     # Correct only interpolated values with proportional allocation
-    for animal_type in common_animal_types:
-        correct_values(animal_type, animal_nloss, animal_val_nloss, interpolated_indices[animal_type])
+    correct_values(sorted(common_animal_types), animal_nloss, animal_val_nloss, interpolated_indices)
 
     #cattle
     animal_nloss['bulls'] = round(animal_nloss['beef']*0.05)
@@ -221,95 +195,142 @@ def refine_animal_data(animal_df, animal_val):
 
     return animal_nloss
 
-def interpolation(ifews_df):
-    df = ifews_df.copy()
-    county_names = df['CountyName'].unique()
-    pop_names = ["corng_y",	"corng_pa",	"corng_ha",	"soy_y","soy_pa","soy_ha"]
-        
-    # Loop through county names and populate data
-    for county_name in county_names:
-        for name in pop_names:
-            k = pop_names.copy()
-            k.remove(name)
-
-            # Filter the DataFrame for the specific county and population
-            county_df = df[(df['CountyName'] == county_name) & (df[name].notna())]
-
-            # Extract x and y values
-            x = county_df['Year'].astype(float).to_numpy()
-            y = county_df[name].astype(float).to_numpy()
+# crop columns filled by interpolation()
+CROP_COLUMNS = ["corng_y", "corng_pa", "corng_ha", "soy_y", "soy_pa", "soy_ha"]
 
-            # Extract xnew values
-            xnew = df[(df['CountyName'] == county_name) & (df[name].isna())]['Year'].astype(float).to_numpy()
+# minimum number of known years of a county for the interp1d kinds (default 2)
+MIN_POINTS = {'quadratic': 3, 'cubic': 4}
 
-            f = interp1d(x, y, kind = 'linear', fill_value="extrapolate")
-            ynew = f(xnew)
+# Fill the missing values of each county by interpolation / extrapolation over the years
+# (scipy interp1d kind, rounded to integers), then set negative values to zero and
+# forward fill zeros. Counties with too few known years for the kind are left missing.
+def interpolation(ifews_df, kind='linear', columns=CROP_COLUMNS):
+    df = ifews_df.copy()
+    # rows in county and year order
+    d = df.sort_values(['CountyName', 'Year'], kind='stable')
+    county = d['CountyName'].to_numpy()
+    year = d['Year'].astype(float).to_numpy()
+
+    for name in columns:
+        y = d[name].astype(float).to_numpy()
+        if kind == 'linear':
+            ynew = _interpolate_linear(county, year, y)
+        else:
+            ynew = _interpolate_groups(county, year, y, kind)
+        missing = np.isnan(y) & ~np.isnan(ynew)
+        df.loc[d.index[missing], name] = np.round(ynew[missing])
 
-            # Update the DataFrame with interpolated values
-            df.loc[(df['CountyName'] == county_name) & (df[name].isna()), name] = np.round(ynew)
-            for col in df.columns:
-                if pd.api.types.is_numeric_dtype(df[col]):
-                    # Replace negative values with zero in the entire column
-                    df[col] = df[col].apply(lambda x: 0 if x < 0 else x)
+    # Replace negative values with zero in all numeric columns
+    numeric = [col for col in df.columns if pd.api.types.is_numeric_dtype(df[col])]
+    df[numeric] = df[numeric].mask(df[numeric] < 0, 0)
 
     # Forward fill consecutive zeros with the last previous value
     df = df.apply(lambda x: x.mask(x == 0).ffill())   
-    return df            
-
-def expand_df(df, validation_df):
-    # Create a list of unique counties
-    counties = df['CountyName'].unique()
-
-    # Create a list of years from 1968 to 2023
-    years = list(range(validation_df['Year'].min(), validation_df['Year'].max()))
-
-    # Create an empty DataFrame to store the expanded data
-    expanded_df = pd.DataFrame(columns=df.columns)
-
-    # Iterate through each county and year, and add rows to the expanded DataFrame
-    for county in counties:
-        for year in years:
-            # Check if the county and year combination already exists in the original DataFrame
-            if not ((df['CountyName'] == county) & (df['Year'] == year)).any():
-                # Create a new row with NaN values for all columns
-                new_row = pd.DataFrame([[county, year] + [pd.NA] * (len(df.columns) - 2)], columns=df.columns)
-                # Append the new row to the expanded DataFrame
-                expanded_df = pd.concat([expanded_df, new_row], ignore_index=True)
-
-    # Concatenate the original DataFrame and the expanded DataFrame
-    new_df = pd.concat([df, expanded_df], ignore_index=True)
-
-    # Sort the DataFrame by CountyName and Year
-    new_df = new_df.sort_values(['CountyName', 'Year']).reset_index(drop=True)
-
-    # Fill any remaining NaN values with appropriate default values
-    new_df = new_df.fillna({'hogs': np.nan, 'hogs_sales': np.nan, 'hogs_breeding':np.nan, 'beef': np.nan, 'milk': np.nan,
-                             'cattle': np.nan, 'steers': np.nan, 'onfeed_sold':np.nan, 
-                                 "corng_y":np.nan,	"corng_pa":np.nan,	"corng_ha":np.nan, "soy_y":np.nan,
-                                 'soy_pa':np.nan, 'soy_ha':np.nan})
-                                 #'broilers': np.nan, 'layers': np.nan, 'turkeys':np.nan,
-    
-    if 'corng_y' in new_df.columns:
-        new_df = new_df.drop_duplicates(subset = ['CountyName', 'Year'])
-
-    new_df = new_df[new_df['Year']<2023]        
-
-    return new_df           
-
-# function to calculate ManureN_kg_ha for each row
-def calculate_manure_n(row):
-    hogs_sows = row['hogs_sow']
-    hogs_boars = row['hogs_boars']
-    hogs_fin = row['hogs_fin']
-    milk_cows = row['milk']
-    beef_cows = row['beef']
-    milk_cows_150 = row['dairy_150']
-    milk_cows_440 = row['dairy_400']
-    beef_bulls = row['bulls']
-    calf = row['steers']
-    cattle_fin = row['fin_cattle']
-    soybeans_acres = row['soy_pa']
-    corn_acres = row['corng_pa']
+    return df
+
+# Linear interpolation / extrapolation of every group at once, with the arithmetic of
+# interp1d(kind='linear', fill_value='extrapolate'): between the neighbouring known
+# points inside the known range, along the first / last segment outside of it.
+# group and x are sorted by group then x, returns the values at all x (NaN for
+# groups with less than 2 known points).
+def _interpolate_linear(group, x, y):
+    n = len(y)
+    codes = pd.factorize(group)[0]
+    known = ~np.isnan(y)
+
+    # previous / next known row of the same group
+    pos = pd.Series(np.where(known, np.arange(n), np.nan))
+    prev = pos.groupby(codes).ffill().to_numpy()
+    nxt = pos.groupby(codes).bfill().to_numpy()
+
+    # first two and last two known rows of each group
+    known_rows = np.flatnonzero(known)
+    groups, start, count = np.unique(codes[known_rows], return_index=True, return_counts=True)
+    n_groups = codes.max() + 1 if n else 0
+    n_known = np.zeros(n_groups, dtype=int)
+    n_known[groups] = count
+    ends = np.zeros((4, n_groups), dtype=int)
+    valid = count >= 2
+    ends[:, groups[valid]] = [known_rows[start[valid]], known_rows[start[valid] + 1],
+                              known_rows[start[valid] + count[valid] - 2],
+                              known_rows[start[valid] + count[valid] - 1]]
+    first, second, before_last, last = ends[:, codes]
+
+    lo = np.where(np.isnan(prev), first, np.where(np.isnan(nxt), before_last, np.nan_to_num(prev))).astype(int)
+    hi = np.where(np.isnan(prev), second, np.where(np.isnan(nxt), last, np.nan_to_num(nxt))).astype(int)
+
+    # (lo = hi on the known rows, their values are not used)
+    with np.errstate(invalid='ignore', divide='ignore'):
+        slope = (y[hi] - y[lo]) / (x[hi] - x[lo])
+        ynew = slope * (x - x[lo]) + y[lo]
+    ynew[n_known[codes] < 2] = np.nan
+    return ynew
+
+# Interpolation / extrapolation of each group with interp1d(kind), same layout as _interpolate_linear
+def _interpolate_groups(group, x, y, kind):
+    ynew = np.full(len(y), np.nan)
+    known = ~np.isnan(y)
+    bounds = np.flatnonzero(np.r_[True, group[1:] != group[:-1], True])
+    for a, b in zip(bounds[:-1], bounds[1:]):
+        k = known[a:b]
+        if k.sum() >= MIN_POINTS.get(kind, 2):
+            f = interp1d(x[a:b][k], y[a:b][k], kind = kind, fill_value="extrapolate")
+            ynew[a:b] = f(x[a:b])
+    return ynew
+
+# Add the missing (county, year) rows (all values NaN) for the years first_year - last_year
+# (default: first validation year - year before the last validation year) and
+# keep the years up to cutoff (default last_year), sorted by county and year.
+def expand_df(df, validation_df=None, first_year=None, last_year=None, cutoff=None):
+    if first_year is None:
+        first_year = validation_df['Year'].min()
+    if last_year is None:
+        last_year = validation_df['Year'].max() - 1
+    if cutoff is None:
+        cutoff = last_year
+
+    if 'corng_y' in df.columns:
+        df = df.drop_duplicates(subset = ['CountyName', 'Year'])
+
+    # reindex onto all counties x years (and the years of df outside that range)
+    indexed = df.set_index(['CountyName', 'Year'])
+    if not indexed.index.is_unique:
+        raise ValueError('expand_df needs one row per (CountyName, Year)')
+    full = pd.MultiIndex.from_product([df['CountyName'].unique(), range(first_year, last_year + 1)],
+                                      names=['CountyName', 'Year'])
+    new_df = indexed.reindex(indexed.index.union(full)).reset_index()[df.columns]
+
+    new_df = new_df[new_df['Year'] <= cutoff]
+
+    return new_df
+
+# Nutrient budget terms, column-wise: data = DataFrame, dict of arrays or a row (Series).
+# A DataFrame gives a Series with its index, arrays give an array.
+def _column(data, name):
+    values = data[name]
+    if hasattr(values, 'to_numpy'):
+        return values.to_numpy(dtype=float, na_value=np.nan)
+    return np.asarray(values, dtype=float)
+
+def _result(data, values):
+    if isinstance(data, pd.DataFrame):
+        return pd.Series(values, index=data.index)
+    return values
+
+# function to calculate ManureN_kg_ha
+def calculate_manure_n(data):
+    hogs_sows = _column(data, 'hogs_sow')
+    hogs_boars = _column(data, 'hogs_boars')
+    hogs_fin = _column(data, 'hogs_fin')
+    milk_cows = _column(data, 'milk')
+    beef_cows = _column(data, 'beef')
+    milk_cows_150 = _column(data, 'dairy_150')
+    milk_cows_440 = _column(data, 'dairy_400')
+    beef_bulls = _column(data, 'bulls')
+    calf = _column(data, 'steers')
+    cattle_fin = _column(data, 'fin_cattle')
+    soybeans_acres = _column(data, 'soy_pa')
+    corn_acres = _column(data, 'corng_pa')
     
     # from Gronberg et al. (2017) and looking into nloss from Andersen, D. S., & Pepple, L. M. (2017) 
     manure_n = (hogs_sows * 0.036 * 365 +
@@ -323,37 +344,37 @@ def calculate_manure_n(row):
                 calf * 0.019 * 365 +
                 cattle_fin * 0.089 * 365) / (0.404686 * (soybeans_acres + corn_acres))
         
-    return round(manure_n, 1)
+    return _result(data, round_values(manure_n, 1))
 
 # function for calculating fixation n
 # soybeans bushels consider 1 metric ton/hectare = 14.87 (15) bushels/acre from https://www.extension.iastate.edu/agdm/wholefarm/pdf/c6-80.pdf
-def calculate_fix_n(row):
-    soybeans_yield = row['soy_y']
-    soybeans_acres = row['soy_pa']
-    corn_acres = row['corng_pa']
+def calculate_fix_n(data):
+    soybeans_yield = _column(data, 'soy_y')
+    soybeans_acres = _column(data, 'soy_pa')
+    corn_acres = _column(data, 'corng_pa')
     
     fix_n = ((soybeans_yield/15)*81.1-98.5)*(soybeans_acres/(soybeans_acres+corn_acres))
     
-    return round(fix_n, 1)
+    return _result(data, round_values(fix_n, 1))
 
 # function for calculation grain nitrogen
-def calculate_grain_n(row):
-    soybeans_yield = row['soy_y']
-    corn_yield = row['corng_y']
-    soybeans_acres_h = row['soy_ha']
-    corn_acres_h = row['corng_ha']
+def calculate_grain_n(data):
+    soybeans_yield = _column(data, 'soy_y')
+    corn_yield = _column(data, 'corng_y')
+    soybeans_acres_h = _column(data, 'soy_ha')
+    corn_acres_h = _column(data, 'corng_ha')
     
     grain_n = ((soybeans_yield*67.25)*(6.4/100)*(soybeans_acres_h*0.404686)+(corn_yield*62.77)*(1.18/100)*corn_acres_h*0.404686)/(0.404686*(soybeans_acres_h+corn_acres_h))
     
-    return round(grain_n, 1)
+    return _result(data, round_values(grain_n, 1))
 
 # function for calculating nitrogen surplus 
-def calculate_ns(row):
-    commercial = row['CN']
-    manure = row['MN']
-    grain = row['GN']
-    fix = row['FN']
+def calculate_ns(data):
+    commercial = _column(data, 'CN')
+    manure = _column(data, 'MN')
+    grain = _column(data, 'GN')
+    fix = _column(data, 'FN')
     
     ns = commercial + manure + fix - grain
     
-    return round(ns, 1)
\ No newline at end of file
+    return _result(data, round_values(ns, 1))
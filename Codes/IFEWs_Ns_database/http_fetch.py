@@ -0,0 +1,62 @@
+import os
+import time
+import threading
+from concurrent.futures import ThreadPoolExecutor
+from urllib.parse import urlsplit
+import requests
+from requests.adapters import HTTPAdapter
+from urllib3.util.retry import Retry
+
+# Fetch layer for the USDA requests: requests run concurrently on a bounded
+# thread pool, each thread keeps one session (connection reuse), failed
+# requests are retried with exponential backoff and requests to the same
+# host are spaced by at least MIN_INTERVAL seconds.
+# USDA_MAX_WORKERS  = number of concurrent requests (default: 6)
+# USDA_MIN_INTERVAL = seconds between two requests to the same host (default: 0.2)
+MAX_WORKERS = int(os.getenv('USDA_MAX_WORKERS', 6))
+MIN_INTERVAL = float(os.getenv('USDA_MIN_INTERVAL', 0.2))
+TIMEOUT = 300
+
+_local = threading.local()
+_host_lock = threading.Lock()
+_host_next = {}
+
+def session():
+    # one keep-alive session per thread
+    if not hasattr(_local, 'session'):
+        retry = Retry(total=5, backoff_factor=1, status_forcelist=[429, 500, 502, 503, 504],
+                      allowed_methods=['GET'], respect_retry_after_header=True)
+        s = requests.Session()
+        s.mount('http://', HTTPAdapter(max_retries=retry))
+        s.mount('https://', HTTPAdapter(max_retries=retry))
+        _local.session = s
+    return _local.session
+
+def wait_turn(url):
+    # per-host rate limiting: reserve the next free slot of the host and sleep until then
+    host = urlsplit(url).netloc
+    with _host_lock:
+        now = time.monotonic()
+        slot = max(now, _host_next.get(host, now))
+        _host_next[host] = slot + MIN_INTERVAL
+    if slot > now:
+        time.sleep(slot - now)
+
+def get(url, headers=None, stream=False):
+    # GET request through the thread's session, raises on HTTP errors except 304
+    wait_turn(url)
+    response = session().get(url, headers=headers, stream=stream, timeout=TIMEOUT)
+    if response.status_code != 304:
+        response.raise_for_status()
+    return response
+
+def run_ordered(tasks, max_workers=None):
+    # run the callables concurrently, results are returned in the order of tasks
+    max_workers = MAX_WORKERS if max_workers is None else max_workers
+    with ThreadPoolExecutor(max_workers=max_workers) as executor:
+        futures = [executor.submit(task) for task in tasks]
+        return [future.result() for future in futures]
+
+def map_ordered(func, items, max_workers=None):
+    # func applied concurrently to every item, results in the order of items
+    return run_ordered([lambda item=item: func(item) for item in items], max_workers)
@@ -0,0 +1,34 @@
+import numpy as np
+import pandas as pd
+
+# Column types of the county-year IFEWs table
+#   CountyName                      category
+#   Year                            int16
+#   livestock counts, crop areas    Int32 (nullable)
+#   N rate and N budget terms       float32
+# Yields keep float64. Columns that are not listed keep their type.
+LIVESTOCK_COLUMNS = ['hogs', 'hogs_sales', 'hogs_breeding', 'beef', 'milk', 'cattle', 'steers', 'onfeed_sold',
+                     'bulls', 'calves', 'beef_heifers', 'dairy_150', 'dairy_400', 'fin_cattle',
+                     'hogs_fin', 'hogs_sow', 'hogs_boars']
+CROP_AREA_COLUMNS = ['corng_pa', 'corng_ha', 'soy_pa', 'soy_ha']
+NUTRIENT_COLUMNS = ['CN_lb/ac', 'CN', 'MN', 'FN', 'GN', 'NS']
+
+SCHEMA = {'CountyName': 'category', 'Year': 'int16'}
+SCHEMA.update({col: 'Int32' for col in LIVESTOCK_COLUMNS + CROP_AREA_COLUMNS})
+SCHEMA.update({col: 'float32' for col in NUTRIENT_COLUMNS})
+
+# df with the SCHEMA types, raises if a count is not a whole number
+def enforce_schema(df):
+    df = df.copy()
+    for col, dtype in SCHEMA.items():
+        if col not in df.columns or df[col].dtype == dtype:
+            continue
+        if dtype == 'Int32':
+            # counts without a value (also 0/0 ratios) are missing
+            values = pd.to_numeric(df[col]).astype(float).replace([np.inf, -np.inf], np.nan)
+            df[col] = values.astype('Int32')
+        elif dtype == 'category':
+            df[col] = df[col].astype('category')
+        else:
+            df[col] = pd.to_numeric(df[col]).astype(dtype)
+    return df
@@ -0,0 +1,76 @@
+import os
+import json
+import hashlib
+import pandas as pd
+from ifews_schema import enforce_schema
+
+# Year-partitioned store of the Ns county database
+#   store_dir/
+#     manifest.json   {'years': {'1968': {'file': 'Ns_1968.csv', 'inputs': <hash>, 'sources': {...}}, ...}}
+#     Ns_1968.csv     rows (counties) of 1968
+#     ...
+# 'inputs' is the fingerprint of the input rows the partition was computed from and
+# 'sources' the versions of the source files (e.g. the N rate shapefile of the year),
+# so an update only recomputes and rewrites the years whose inputs changed.
+class NsStore:
+
+    def __init__(self, path):
+        self.path = path
+        self.manifest_file = os.path.join(path, 'manifest.json')
+        os.makedirs(path, exist_ok=True)
+
+        if os.path.exists(self.manifest_file):
+            with open(self.manifest_file) as f:
+                self.manifest = json.load(f)
+        else:
+            self.manifest = {'years': {}}
+
+    def years(self):
+        return sorted(int(y) for y in self.manifest['years'])
+
+    def source(self, year, name):
+        # stored version of a source of the partition of year (None if unknown)
+        entry = self.manifest['years'].get(str(year))
+        return None if entry is None else entry['sources'].get(name)
+
+    @staticmethod
+    def fingerprint(df):
+        # hash of the rows of one year, independent of the row order
+        df = df.sort_values('CountyName').reset_index(drop=True)
+        return hashlib.sha256(df.to_csv(index=False).encode('utf-8')).hexdigest()
+
+    def changed_years(self, inputs):
+        # years of the inputs (DataFrame with Year and CountyName) that are new or differ from the store
+        changed = []
+        for year, rows in inputs.groupby('Year'):
+            entry = self.manifest['years'].get(str(year))
+            if entry is None or entry['inputs'] != self.fingerprint(rows):
+                changed.append(int(year))
+        return changed
+
+    def write(self, year, df, inputs, sources=None):
+        # store the rows of year, inputs = the input rows they were computed from
+        name = 'Ns_{}.csv'.format(year)
+        tmp = os.path.join(self.path, name + '.tmp')
+        df.to_csv(tmp, index=False)
+        os.replace(tmp, os.path.join(self.path, name))
+
+        self.manifest['years'][str(year)] = {'file': name, 'inputs': self.fingerprint(inputs),
+                                             'sources': sources or {}}
+        self._save_manifest()
+
+    def read(self, years=None, typed=True):
+        # rows of the given years (default all) as one DataFrame,
+        # with the ifews_schema types (typed=False: as stored, full precision)
+        years = self.years() if years is None else years
+        files = [os.path.join(self.path, self.manifest['years'][str(y)]['file']) for y in years]
+        if not files:
+            return pd.DataFrame()
+        df = pd.concat([pd.read_csv(f, float_precision='round_trip') for f in files], ignore_index=True)
+        return enforce_schema(df) if typed else df
+
+    def _save_manifest(self):
+        tmp = self.manifest_file + '.tmp'
+        with open(tmp, 'w') as f:
+            json.dump(self.manifest, f, indent=1)
+        os.replace(tmp, self.manifest_file)
@@ -1,37 +1,44 @@
-import urllib.parse
+from functools import partial
 import pandas as pd
+import http_fetch
 from c_usda_quick_stats import c_usda_quick_stats
+from quickstats_query import QuickStatsQuery
 
-def encode_parameters(params):
-    return urllib.parse.urlencode(params)
+# columns of the state series (penguinlabs) used by ap() and cp()
+STATE_COLUMNS = {'state_name': str, 'year': 'int64', 'Value': str}
+
+def read_state_csv(url):
+    # cached like the QuickStats responses (c_usda_quick_stats cache, TTL and offline mode)
+    return c_usda_quick_stats().get_url_data(url, columns=STATE_COLUMNS)
 
 #Corn Grain Yield Bu/Acre
-corng_y=    'source_desc=SURVEY' +  \
-                '&sector_desc=CROPS' + \
-                '&commodity_desc=CORN' + \
-                '&statisticcat_desc=YIELD' + \
-                '&util_practice_desc=GRAIN' + \
-                '&' + urllib.parse.quote('short_desc=CORN, GRAIN - YIELD, MEASURED IN BU / ACRE') + \
-                '&freq_desc=ANNUAL' + \
-                '&reference_period_desc=YEAR' + \
-                '&year__GE=1968' + \
-                '&agg_level_desc=COUNTY' + \
-                '&state_name=IOWA' + \
-                '&county_code__LT=998' + \
-                '&format=CSV'
+corng_y = QuickStatsQuery('corng_y',
+                source_desc='SURVEY',
+                sector_desc='CROPS',
+                commodity_desc='CORN',
+                statisticcat_desc='YIELD',
+                util_practice_desc='GRAIN',
+                short_desc='CORN, GRAIN - YIELD, MEASURED IN BU / ACRE',
+                freq_desc='ANNUAL',
+                reference_period_desc='YEAR',
+                agg_level_desc='COUNTY',
+                state_name='IOWA',
+                county_code_lt=998,
+                year_ge=1968)
 
 #Soybean Yield Bu/Acre
-soy_y =    'source_desc=SURVEY' +  \
-                '&sector_desc=CROPS' + \
-                '&commodity_desc=SOYBEANS' + \
-                '&statisticcat_desc=YIELD' + \
-                '&' + urllib.parse.quote('short_desc=SOYBEANS - YIELD, MEASURED IN BU / ACRE') + \
-                '&freq_desc=ANNUAL' + \
-                '&reference_period_desc=YEAR' + \
-                '&year__GE=1968' + \
-                '&agg_level_desc=COUNTY' + \
-                '&state_name=IOWA' + \
-                '&format=CSV'
+soy_y = QuickStatsQuery('soy_y',
+                source_desc='SURVEY',
+                sector_desc='CROPS',
+                commodity_desc='SOYBEANS',
+                statisticcat_desc='YIELD',
+                short_desc='SOYBEANS - YIELD, MEASURED IN BU / ACRE',
+                freq_desc='ANNUAL',
+                reference_period_desc='YEAR',
+                agg_level_desc='COUNTY',
+                state_name='IOWA',
+                county_code_lt=998,
+                year_ge=1968)
 
 # #Corn Silage Yield Tons/Acre
 # parameters3 =    'source_desc=SURVEY' +  \
@@ -49,35 +56,33 @@ soy_y =    'source_desc=SURVEY' +  \
 #                 '&format=CSV'
 
 #Corn Area Planted Acres
-corng_pa =    'source_desc=SURVEY' +  \
-                '&sector_desc=CROPS' + \
-                '&commodity_desc=CORN' + \
-                '&statisticcat_desc__LIKE=PLANTED' + \
-                '&' + urllib.parse.quote('short_desc=CORN - ACRES PLANTED') + \
-                '&unit_desc=ACRES' + \
-                '&freq_desc=ANNUAL' + \
-                '&reference_period_desc=YEAR' + \
-                '&year__GE=1968' + \
-                '&agg_level_desc=COUNTY' + \
-                '&state_name=IOWA' + \
-                '&county_code__LT=998' + \
-                '&format=CSV'
+corng_pa = QuickStatsQuery('corng_pa',
+                source_desc='SURVEY',
+                sector_desc='CROPS',
+                commodity_desc='CORN',
+                short_desc='CORN - ACRES PLANTED',
+                unit_desc='ACRES',
+                freq_desc='ANNUAL',
+                reference_period_desc='YEAR',
+                agg_level_desc='COUNTY',
+                state_name='IOWA',
+                county_code_lt=998,
+                year_ge=1968)
 
 #Corn Area Harvested Acres (grain)
-corng_ha=    'source_desc=SURVEY' +  \
-                '&sector_desc=CROPS' + \
-                '&commodity_desc=CORN' + \
-                '&util_practice_desc=GRAIN' + \
-                '&statisticcat_desc__LIKE=HARVESTED' + \
-                '&' + urllib.parse.quote('short_desc=CORN, GRAIN - ACRES HARVESTED') + \
-                '&unit_desc=ACRES' + \
-                '&freq_desc=ANNUAL' + \
-                '&reference_period_desc=YEAR' + \
-                '&year__GE=1968' + \
-                '&agg_level_desc=COUNTY' + \
-                '&state_name=IOWA' + \
-                '&county_code__LT=998' + \
-                '&format=CSV'
+corng_ha = QuickStatsQuery('corng_ha',
+                source_desc='SURVEY',
+                sector_desc='CROPS',
+                commodity_desc='CORN',
+                util_practice_desc='GRAIN',
+                short_desc='CORN, GRAIN - ACRES HARVESTED',
+                unit_desc='ACRES',
+                freq_desc='ANNUAL',
+                reference_period_desc='YEAR',
+                agg_level_desc='COUNTY',
+                state_name='IOWA',
+                county_code_lt=998,
+                year_ge=1968)
 
 # #Corn Area Harvested Acres (silage)
 # parameters6 =    'source_desc=SURVEY' +  \
@@ -96,119 +101,120 @@ corng_ha=    'source_desc=SURVEY' +  \
 #                 '&format=CSV'
 
 #Soybean Area Planted Acres
-soy_pa =    'source_desc=SURVEY' +  \
-                '&sector_desc=CROPS' + \
-                '&' + urllib.parse.quote('group_desc=FIELD CROPS') + \
-                '&commodity_desc=SOYBEANS' + \
-                '&statisticcat_desc__LIKE=PLANTED' + \
-                '&' + urllib.parse.quote('short_desc=SOYBEANS - ACRES PLANTED') + \
-                '&unit_desc=ACRES' + \
-                '&freq_desc=ANNUAL' + \
-                '&reference_period_desc=YEAR' + \
-                '&year__GE=1968' + \
-                '&agg_level_desc=COUNTY' + \
-                '&state_name=IOWA' + \
-                '&county_code__LT=998' + \
-                '&format=CSV'
+soy_pa = QuickStatsQuery('soy_pa',
+                source_desc='SURVEY',
+                sector_desc='CROPS',
+                group_desc='FIELD CROPS',
+                commodity_desc='SOYBEANS',
+                short_desc='SOYBEANS - ACRES PLANTED',
+                unit_desc='ACRES',
+                freq_desc='ANNUAL',
+                reference_period_desc='YEAR',
+                agg_level_desc='COUNTY',
+                state_name='IOWA',
+                county_code_lt=998,
+                year_ge=1968)
 
 #Soybean Area Harvested Acres
-soy_ha =    'source_desc=SURVEY' +  \
-                '&sector_desc=CROPS' + \
-                '&' + urllib.parse.quote('group_desc=FIELD CROPS') + \
-                '&commodity_desc=SOYBEANS' + \
-                '&statisticcat_desc__LIKE=HARVESTED' + \
-                '&' + urllib.parse.quote('short_desc=SOYBEANS - ACRES PLANTED') + \
-                '&unit_desc=ACRES' + \
-                '&freq_desc=ANNUAL' + \
-                '&reference_period_desc=YEAR' + \
-                '&year__GE=1968' + \
-                '&agg_level_desc=COUNTY' + \
-                '&state_name=IOWA' + \
-                '&county_code__LT=998' + \
-                '&format=CSV'
+soy_ha = QuickStatsQuery('soy_ha',
+                source_desc='SURVEY',
+                sector_desc='CROPS',
+                group_desc='FIELD CROPS',
+                commodity_desc='SOYBEANS',
+                short_desc='SOYBEANS - ACRES HARVESTED',
+                unit_desc='ACRES',
+                freq_desc='ANNUAL',
+                reference_period_desc='YEAR',
+                agg_level_desc='COUNTY',
+                state_name='IOWA',
+                county_code_lt=998,
+                year_ge=1968)
 # -------------------------- Census and Suryey -----------------------------------------
 # Hogs
-hogs =   urllib.parse.quote('sector_desc=ANIMALS & PRODUCTS') + \
-                '&group_desc=LIVESTOCK' + \
-                '&commodity_desc=HOGS' + \
-                '&statisticcat_desc=INVENTORY' + \
-                '&domain_desc=TOTAL' + \
-                '&' + urllib.parse.quote('domaincat_desc=NOT SPECIFIED') + \
-                '&unit_desc=HEAD' + \
-                '&year__GE=1968' + \
-                '&agg_level_desc=COUNTY' + \
-                '&state_name=IOWA' + \
-                '&county_code__LT=998' + \
-                '&format=CSV'
+hogs = QuickStatsQuery('hogs',
+                sector_desc='ANIMALS & PRODUCTS',
+                group_desc='LIVESTOCK',
+                commodity_desc='HOGS',
+                statisticcat_desc='INVENTORY',
+                short_desc='HOGS - INVENTORY',
+                domain_desc='TOTAL',
+                domaincat_desc='NOT SPECIFIED',
+                unit_desc='HEAD',
+                agg_level_desc='COUNTY',
+                state_name='IOWA',
+                county_code_lt=998,
+                year_ge=1968)
 
 # Breeding hogs inventory - sows + boars ratio 20:1 and # Hogs sales
-hogs_others =  urllib.parse.quote('sector_desc=ANIMALS & PRODUCTS') + \
-                '&group_desc=LIVESTOCK' + \
-                '&commodity_desc=HOGS' + \
-                '&' + urllib.parse.quote('util_practice_desc= BREEDING') + \
-                '&' + urllib.parse.quote('domaincat_desc=NOT SPECIFIED') + \
-                '&unit_desc=HEAD' + \
-                '&year__GE=1968' + \
-                '&agg_level_desc=COUNTY' + \
-                '&state_name=IOWA' + \
-                '&county_code__LT=998' + \
-                '&format=CSV'
+hogs_others = QuickStatsQuery('hogs_others',
+                sector_desc='ANIMALS & PRODUCTS',
+                group_desc='LIVESTOCK',
+                commodity_desc='HOGS',
+                short_desc=('HOGS, BREEDING - INVENTORY', 'HOGS - SALES, MEASURED IN HEAD'),
+                domain_desc='TOTAL',
+                domaincat_desc='NOT SPECIFIED',
+                unit_desc='HEAD',
+                agg_level_desc='COUNTY',
+                state_name='IOWA',
+                county_code_lt=998,
+                year_ge=1968)
 
 # Beef Cows
-beef =    urllib.parse.quote('sector_desc=ANIMALS & PRODUCTS') + \
-                '&group_desc=LIVESTOCK' + \
-                '&commodity_desc=CATTLE' + \
-                '&class_desc__LIKE=BEEF' + \
-                '&statisticcat_desc=INVENTORY' + \
-                '&domain_desc=TOTAL' + \
-                '&' + urllib.parse.quote('domaincat_desc=NOT SPECIFIED') + \
-                '&unit_desc=HEAD' + \
-                '&year__GE=1968' + \
-                '&agg_level_desc=COUNTY' + \
-                '&state_name=IOWA' + \
-                '&county_code__LT=998' + \
-                '&format=CSV'
+beef = QuickStatsQuery('beef',
+                sector_desc='ANIMALS & PRODUCTS',
+                group_desc='LIVESTOCK',
+                commodity_desc='CATTLE',
+                statisticcat_desc='INVENTORY',
+                short_desc='CATTLE, COWS, BEEF - INVENTORY',
+                domain_desc='TOTAL',
+                domaincat_desc='NOT SPECIFIED',
+                unit_desc='HEAD',
+                agg_level_desc='COUNTY',
+                state_name='IOWA',
+                county_code_lt=998,
+                year_ge=1968)
 # Milk
-milk =   urllib.parse.quote('sector_desc=ANIMALS & PRODUCTS') + \
-                '&group_desc=LIVESTOCK' + \
-                '&commodity_desc=CATTLE' + \
-                '&class_desc__LIKE=MILK' + \
-                '&statisticcat_desc=INVENTORY' + \
-                '&domain_desc=TOTAL' + \
-                '&' + urllib.parse.quote('domaincat_desc=NOT SPECIFIED') + \
-                '&unit_desc=HEAD' + \
-                '&year__GE=1968' + \
-                '&agg_level_desc=COUNTY' + \
-                '&state_name=IOWA' + \
-                '&county_code__LT=998' + \
-                '&format=CSV'
+milk = QuickStatsQuery('milk',
+                sector_desc='ANIMALS & PRODUCTS',
+                group_desc='LIVESTOCK',
+                commodity_desc='CATTLE',
+                statisticcat_desc='INVENTORY',
+                short_desc='CATTLE, COWS, MILK - INVENTORY',
+                domain_desc='TOTAL',
+                domaincat_desc='NOT SPECIFIED',
+                unit_desc='HEAD',
+                agg_level_desc='COUNTY',
+                state_name='IOWA',
+                county_code_lt=998,
+                year_ge=1968)
 # All cattle
-other_cattle =   urllib.parse.quote('sector_desc=ANIMALS & PRODUCTS') + \
-                '&group_desc=LIVESTOCK' + \
-                '&commodity_desc=CATTLE' + \
-                '&' +urllib.parse.quote('class_desc=INCL CALVES') + \
-                '&statisticcat_desc=INVENTORY' + \
-                '&unit_desc=HEAD' + \
-                    '&' +urllib.parse.quote('short_desc=CATTLE, INCL CALVES - INVENTORY') + \
-                    '&domain_desc=TOTAL' + \
-                '&year__GE=1968' + \
-                '&agg_level_desc=COUNTY' + \
-                '&state_name=IOWA' + \
-                '&county_code__LT=998' + \
-                '&format=CSV'
+other_cattle = QuickStatsQuery('other_cattle',
+                sector_desc='ANIMALS & PRODUCTS',
+                group_desc='LIVESTOCK',
+                commodity_desc='CATTLE',
+                class_desc='INCL CALVES',
+                statisticcat_desc='INVENTORY',
+                short_desc='CATTLE, INCL CALVES - INVENTORY',
+                domain_desc='TOTAL',
+                unit_desc='HEAD',
+                agg_level_desc='COUNTY',
+                state_name='IOWA',
+                county_code_lt=998,
+                year_ge=1968)
 
 # Cattle on Feed = steers and on feed sales - CATTLE, ON FEED - INVENTORY', 'CATTLE, ON FEED - SALES FOR SLAUGHTER, MEASURED IN HEAD'
-on_feed =   urllib.parse.quote('sector_desc=ANIMALS & PRODUCTS') + \
-            '&group_desc=LIVESTOCK' + \
-            '&commodity_desc=CATTLE' + \
-            '&' +urllib.parse.quote('prodn_practice_desc=ON FEED') + \
-            '&' +urllib.parse.quote('domain_desc=SALES') + \
-            '&unit_desc=HEAD' + \
-            '&year__GE=1968' + \
-            '&agg_level_desc=COUNTY' + \
-            '&state_name=IOWA' + \
-            '&county_code__LT=998' + \
-            '&format=CSV'
+on_feed = QuickStatsQuery('on_feed',
+                sector_desc='ANIMALS & PRODUCTS',
+                group_desc='LIVESTOCK',
+                commodity_desc='CATTLE',
+                prodn_practice_desc='ON FEED',
+                short_desc=('CATTLE, ON FEED - INVENTORY', 'CATTLE, ON FEED - SALES FOR SLAUGHTER, MEASURED IN HEAD'),
+                domain_desc='TOTAL',
+                unit_desc='HEAD',
+                agg_level_desc='COUNTY',
+                state_name='IOWA',
+                county_code_lt=998,
+                year_ge=1968)
 
 # # Chicken = 'CHICKENS, LAYERS - INVENTORY', 'CHICKENS, BROILERS - INVENTORY',
 # chicken =   urllib.parse.quote('sector_desc=ANIMALS & PRODUCTS') + \
@@ -274,45 +280,50 @@ on_feed =   urllib.parse.quote('sector_desc=ANIMALS & PRODUCTS') + \
 
 
 def ap(): #animal population
+    #on feed
+    on_feed_s = QuickStatsQuery('on_feed_s',
+                sector_desc='ANIMALS & PRODUCTS',
+                group_desc='LIVESTOCK',
+                commodity_desc='CATTLE',
+                prodn_practice_desc='ON FEED',
+                short_desc=('CATTLE, ON FEED - INVENTORY', 'CATTLE, ON FEED - SALES FOR SLAUGHTER, MEASURED IN HEAD'),
+                domain_desc='TOTAL',
+                unit_desc='HEAD',
+                agg_level_desc='STATE',
+                state_name='IOWA',
+                year_ge=1968)
+    stats = c_usda_quick_stats()
+
+    # all series are downloaded concurrently
+    ap_cbval, ap_cmval, ap_cicval, df, ap_hval, ap_hbval, ap_hsval = http_fetch.run_ordered([
+        partial(read_state_csv, 'https://api.usda-reports.penguinlabs.net/data.csv?short_desc=CATTLE%2C+COWS%2C+BEEF+-+INVENTORY&year__GE=1968&agg_level_desc=STATE&reference_period_desc=FIRST+OF+JAN'),
+        partial(read_state_csv, 'https://api.usda-reports.penguinlabs.net/data.csv?short_desc=CATTLE%2C+COWS%2C+MILK+-+INVENTORY&year__GE=1968&agg_level_desc=STATE&reference_period_desc=FIRST+OF+JAN'),
+        partial(read_state_csv, 'https://api.usda-reports.penguinlabs.net/data.csv?short_desc=CATTLE%2C+INCL+CALVES+-+INVENTORY&year__GE=1968&agg_level_desc=STATE&reference_period_desc=FIRST+OF+JAN'),
+        partial(stats.get_query, on_feed_s),
+        partial(read_state_csv, 'https://api.usda-reports.penguinlabs.net/data.csv?short_desc=HOGS+-+INVENTORY&year__GE=1968&agg_level_desc=STATE&reference_period_desc=FIRST+OF+DEC'),
+        partial(read_state_csv, 'https://api.usda-reports.penguinlabs.net/data.csv?short_desc=HOGS,+BREEDING+-+INVENTORY&year__GE=1968&agg_level_desc=STATE&reference_period_desc=FIRST+OF+DEC'),
+        partial(read_state_csv, 'https://api.usda-reports.penguinlabs.net/data.csv?short_desc=HOGS+-+SALES,+MEASURED+IN+HEAD&year__GE=1968&agg_level_desc=STATE&reference_period_desc=YEAR'),
+    ])
+
     # Cattle
-    ap_cbval = pd.read_csv('https://api.usda-reports.penguinlabs.net/data.csv?short_desc=CATTLE%2C+COWS%2C+BEEF+-+INVENTORY&year__GE=1968&agg_level_desc=STATE&reference_period_desc=FIRST+OF+JAN')
     ap_cbval = ap_cbval[ap_cbval['state_name'] == 'IOWA'][['Value', 'year']]
     ap_cbval.rename(columns={'Value': 'beef'}, inplace=True)
-    ap_cmval = pd.read_csv('https://api.usda-reports.penguinlabs.net/data.csv?short_desc=CATTLE%2C+COWS%2C+MILK+-+INVENTORY&year__GE=1968&agg_level_desc=STATE&reference_period_desc=FIRST+OF+JAN')
     ap_cmval = ap_cmval[ap_cmval['state_name'] == 'IOWA'][['Value', 'year']]
     ap_cmval.rename(columns={'Value': 'milk'}, inplace=True)
-    ap_cicval = pd.read_csv('https://api.usda-reports.penguinlabs.net/data.csv?short_desc=CATTLE%2C+INCL+CALVES+-+INVENTORY&year__GE=1968&agg_level_desc=STATE&reference_period_desc=FIRST+OF+JAN')
     ap_cicval = ap_cicval[ap_cicval['state_name'] == 'IOWA'][['Value', 'year']]
     ap_cicval.rename(columns={'Value': 'cattle'}, inplace=True)
-    #on feed
-    on_feed_s =   urllib.parse.quote('sector_desc=ANIMALS & PRODUCTS') + \
-            '&group_desc=LIVESTOCK' + \
-            '&commodity_desc=CATTLE' + \
-            '&' +urllib.parse.quote('prodn_practice_desc=ON FEED') + \
-            '&' +urllib.parse.quote('domain_desc=SALES') + \
-            '&unit_desc=HEAD' + \
-            '&year__GE=1968' + \
-            '&agg_level_desc=STATE' + \
-            '&state_name=IOWA' + \
-            '&format=CSV'
-    
-    stats = c_usda_quick_stats()
-    df = stats.get_data(on_feed_s)
     # cattle steers
-    ap_csval = df[(df['short_desc'] == 'CATTLE, ON FEED - INVENTORY') & (df['domain_desc'] == 'TOTAL')][['Value', 'year']]
+    ap_csval = df[df['short_desc'] == 'CATTLE, ON FEED - INVENTORY'][['Value', 'year']]
     ap_csval.rename(columns={'Value': 'steers'}, inplace=True)
     # cattle for sale
-    ap_sval = df[(df['short_desc'] == 'CATTLE, ON FEED - SALES FOR SLAUGHTER, MEASURED IN HEAD') & (df['domain_desc'] == 'TOTAL')][['Value', 'year']]
+    ap_sval = df[df['short_desc'] == 'CATTLE, ON FEED - SALES FOR SLAUGHTER, MEASURED IN HEAD'][['Value', 'year']]
     ap_sval.rename(columns={'Value': 'onfeed_sold'}, inplace=True)
     
     # Hogs
-    ap_hval = pd.read_csv('https://api.usda-reports.penguinlabs.net/data.csv?short_desc=HOGS+-+INVENTORY&year__GE=1968&agg_level_desc=STATE&reference_period_desc=FIRST+OF+DEC')
     ap_hval = ap_hval[ap_hval['state_name'] == 'IOWA'][['Value', 'year']]
     ap_hval.rename(columns={'Value': 'hogs'}, inplace=True)
-    ap_hbval = pd.read_csv('https://api.usda-reports.penguinlabs.net/data.csv?short_desc=HOGS,+BREEDING+-+INVENTORY&year__GE=1968&agg_level_desc=STATE&reference_period_desc=FIRST+OF+DEC')
     ap_hbval = ap_hbval[ap_hbval['state_name'] == 'IOWA'][['Value', 'year']]
     ap_hbval.rename(columns={'Value': 'hogs_breeding'}, inplace=True)
-    ap_hsval = pd.read_csv('https://api.usda-reports.penguinlabs.net/data.csv?short_desc=HOGS+-+SALES,+MEASURED+IN+HEAD&year__GE=1968&agg_level_desc=STATE&reference_period_desc=YEAR')
     ap_hsval = ap_hsval[ap_hsval['state_name'] == 'IOWA'][['Value', 'year']]
     ap_hsval.rename(columns={'Value': 'hogs_sales'}, inplace=True)
 
@@ -333,24 +344,28 @@ def ap(): #animal population
     return merged_data  
 
 def cp(): #crop production
+    # all series are downloaded concurrently
+    cp_cyval, cp_chval, cp_cpval, cp_syval, cp_shval, cp_spval = http_fetch.map_ordered(read_state_csv, [
+        'https://api.usda-reports.penguinlabs.net/data.csv?short_desc=CORN%2C+GRAIN+-+YIELD%2C+MEASURED+IN+BU+%2F+ACRE&year__GE=1968&agg_level_desc=STATE',
+        'https://api.usda-reports.penguinlabs.net/data.csv?short_desc=CORN%2C+GRAIN+-+ACRES+HARVESTED&year__GE=1968&agg_level_desc=STATE',
+        'https://api.usda-reports.penguinlabs.net/data.csv?short_desc=CORN+-+ACRES+PLANTED&year__GE=1968&agg_level_desc=STATE',
+        'https://api.usda-reports.penguinlabs.net/data.csv?short_desc=SOYBEANS+-+YIELD%2C+MEASURED+IN+BU+%2F+ACRE&year__GE=1968&agg_level_desc=STATE',
+        'https://api.usda-reports.penguinlabs.net/data.csv?short_desc=SOYBEANS+-+ACRES+HARVESTED&year__GE=1968&agg_level_desc=STATE',
+        'https://api.usda-reports.penguinlabs.net/data.csv?short_desc=SOYBEANS+-+ACRES+PLANTED&year__GE=1968&agg_level_desc=STATE',
+    ])
+
     # crop production corn yield validation
-    cp_cyval = pd.read_csv('https://api.usda-reports.penguinlabs.net/data.csv?short_desc=CORN%2C+GRAIN+-+YIELD%2C+MEASURED+IN+BU+%2F+ACRE&year__GE=1968&agg_level_desc=STATE')
     cp_cyval = cp_cyval[cp_cyval['state_name'] == 'IOWA'][['Value', 'year']]
     cp_cyval.rename(columns={'Value': 'corng_y'}, inplace=True)
-    cp_chval = pd.read_csv('https://api.usda-reports.penguinlabs.net/data.csv?short_desc=CORN%2C+GRAIN+-+ACRES+HARVESTED&year__GE=1968&agg_level_desc=STATE')
     cp_chval = cp_chval[cp_chval['state_name'] == 'IOWA'][['Value', 'year']]
     cp_chval.rename(columns={'Value': 'corng_ha'}, inplace=True)
-    cp_cpval = pd.read_csv('https://api.usda-reports.penguinlabs.net/data.csv?short_desc=CORN+-+ACRES+PLANTED&year__GE=1968&agg_level_desc=STATE')
     cp_cpval = cp_cpval[cp_cpval['state_name'] == 'IOWA'][['Value', 'year']]
     cp_cpval.rename(columns={'Value': 'corng_pa'}, inplace=True)
     
-    cp_syval = pd.read_csv('https://api.usda-reports.penguinlabs.net/data.csv?short_desc=SOYBEANS+-+YIELD%2C+MEASURED+IN+BU+%2F+ACRE&year__GE=1968&agg_level_desc=STATE')
     cp_syval = cp_syval[cp_syval['state_name'] == 'IOWA'][['Value', 'year']]
     cp_syval.rename(columns={'Value': 'soy_y'}, inplace=True)
-    cp_shval = pd.read_csv('https://api.usda-reports.penguinlabs.net/data.csv?short_desc=SOYBEANS+-+ACRES+HARVESTED&year__GE=1968&agg_level_desc=STATE')
     cp_shval = cp_shval[cp_shval['state_name'] == 'IOWA'][['Value', 'year']]
     cp_shval.rename(columns={'Value': 'soy_ha'}, inplace=True)
-    cp_spval = pd.read_csv('https://api.usda-reports.penguinlabs.net/data.csv?short_desc=SOYBEANS+-+ACRES+PLANTED&year__GE=1968&agg_level_desc=STATE')
     cp_spval = cp_spval[cp_spval['state_name'] == 'IOWA'][['Value', 'year']]
     cp_spval.rename(columns={'Value': 'soy_pa'}, inplace=True)
 
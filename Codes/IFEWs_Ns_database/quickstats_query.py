@@ -0,0 +1,84 @@
+import itertools
+import time
+import urllib.parse
+from dataclasses import dataclass, fields, replace
+from typing import Optional, Tuple, Union
+
+# Largest number of records the QuickStats api_GET returns for one request
+MAX_ROWS = 50000
+
+# A filter is one value or a tuple of values (any of them)
+Values = Union[str, Tuple[str, ...]]
+
+# QuickStats query builder: every filter is sent to the server and the
+# parameter string is generated (URL encoded) from the typed fields.
+# A filter with several values is sent as one request per value.
+@dataclass(frozen=True)
+class QuickStatsQuery:
+    name: str
+    source_desc: Optional[Values] = None
+    sector_desc: Optional[Values] = None
+    group_desc: Optional[Values] = None
+    commodity_desc: Optional[Values] = None
+    class_desc: Optional[Values] = None
+    prodn_practice_desc: Optional[Values] = None
+    util_practice_desc: Optional[Values] = None
+    statisticcat_desc: Optional[Values] = None
+    unit_desc: Optional[Values] = None
+    short_desc: Optional[Values] = None
+    domain_desc: Optional[Values] = None
+    domaincat_desc: Optional[Values] = None
+    freq_desc: Optional[Values] = None
+    reference_period_desc: Optional[Values] = None
+    agg_level_desc: Optional[Values] = None
+    state_name: Optional[Values] = None
+    county_code_lt: Optional[int] = None
+    year_ge: int = 1968
+    year_le: Optional[int] = None
+
+    def __post_init__(self):
+        for name, value in self.filters():
+            values = value if isinstance(value, tuple) else (value,)
+            if not values or not all(isinstance(v, str) for v in values):
+                raise TypeError('QuickStats filter {} must be a string or a tuple of strings'.format(name))
+        if self.year_le is not None and self.year_le < self.year_ge:
+            raise ValueError('year_le ({}) is before year_ge ({})'.format(self.year_le, self.year_ge))
+
+    def filters(self):
+        # (parameter, value) of the text filters that are set
+        return [(f.name, getattr(self, f.name)) for f in fields(self)
+                if f.name not in ('name', 'county_code_lt', 'year_ge', 'year_le')
+                and getattr(self, f.name) is not None]
+
+    def last_year(self):
+        return self.year_le if self.year_le is not None else time.localtime().tm_year
+
+    def split_values(self):
+        # one query per combination of the values of the multi-valued filters
+        multi = [(name, value) for name, value in self.filters() if isinstance(value, tuple)]
+        if not multi:
+            return [self]
+        names = [name for name, _ in multi]
+        return [replace(self, **dict(zip(names, combination)))
+                for combination in itertools.product(*(value for _, value in multi))]
+
+    def split_years(self):
+        # the query as two queries over the two halves of its year range
+        last = self.last_year()
+        middle = (self.year_ge + last) // 2
+        return [replace(self, year_le=middle), replace(self, year_ge=middle + 1, year_le=last)]
+
+    def encode(self):
+        # parameter string of the api_GET / get_counts APIs
+        pairs = []
+        for name, value in self.filters():
+            if isinstance(value, tuple):
+                raise ValueError('{} has several values, encode the queries of split_values()'.format(name))
+            pairs.append((name, value))
+        if self.county_code_lt is not None:
+            pairs.append(('county_code__LT', self.county_code_lt))
+        pairs.append(('year__GE', self.year_ge))
+        if self.year_le is not None:
+            pairs.append(('year__LE', self.year_le))
+        pairs.append(('format', 'CSV'))
+        return urllib.parse.urlencode(pairs)
@@ -0,0 +1,14 @@
+import numpy as np
+
+# round(x, decimals) of every value: np.round differs from round() next to ties
+# (np.round(0.15, 1) = 0.2, round(0.15, 1) = 0.1), those values are rounded by round()
+def round_values(values, decimals=1):
+    values = np.asarray(values, dtype=float)
+    rounded = np.array(np.round(values, decimals))
+    scaled = values * 10.0 ** decimals
+    with np.errstate(invalid='ignore'):
+        # inf (0 acres) is not a tie
+        near_tie = np.abs(scaled - np.floor(scaled) - 0.5) < 1e-9 + np.abs(scaled) * 1e-12
+    if near_tie.any():
+        rounded[near_tie] = [round(float(v), decimals) for v in values[near_tie]]
+    return rounded[()]
@@ -19,386 +19,674 @@ Input variables:
  
 Output: N_surplus,'y_c','y_soy','CN','MN','FN','GN' 
 
+Usage:
+ IFEW(x, w, display)  = one scenario through the OpenMDAO model
+ IFEWModel()          = reusable OpenMDAO model, evaluate(x, w) per scenario
+ IFEW_batch(X, W)     = vectorized model for (n, 6) inputs and (n, 5) weather data
+
 
 ============================================
 """
 
+import os
+
 import numpy as np
 import openmdao.api as om
 import pandas as pd
 from sklearn import linear_model
 
 
-def corn_soy_weather(x0):
-    # load corn yield data -----------
-    loc1 = 'crop_yield_data/Corn_y_model_data_v2.csv'
-    dfC = pd.read_csv(loc1)  
-    
-    loc2 = 'crop_yield_data/Soy_y_model_data_v2.csv'
-    dfS = pd.read_csv(loc2)
-    
-    # Create linear regression object for corn -----------
-    regrC = linear_model.LinearRegression()
-    regrC.fit(dfC[['year','May_P','Jul_T','Jul_ppt','Jul_ppt_sq','June_ppt']].values, dfC['corn_yield'].values)
-    
-    # Create linear regression object for soybean
-    regrS = linear_model.LinearRegression()
-    regrS.fit(dfS[['year','JulAug_T','JulAug_ppt','JulAug_ppt_sq','June_ppt']].values, dfS['soy_yield'].values)
-    
-    #x0 = 'May_P','Jul_T','Jul_ppt','Jul_ppt_sq','June_ppt'    
-    x = np.hstack((2020, x0))
-    x = [x.tolist()]    
-    xs = np.hstack((2020, x0[1:]))
-    xs = [xs.tolist()]
-    y_c = regrC.predict(x)[0]
-    y_s = regrS.predict(xs)[0]
-    
-    return y_c,y_s
+# location of the crop yield regression data
+data_dir = os.path.join(os.path.dirname(os.path.abspath(__file__)), 'crop_yield_data')
 
 
-def IFEW(x,w,display):   
+class WeatherYieldModel(object):
     """
-    IFEWs function takes input variable x and weather data w 
-    and output important parameters of IFEWs model        
+    Weather crop yield regressions: the corn and soybean data are loaded and
+    fitted once, predictions are a plain dot product with the coefficients
     """
-    class Weather_crop_yield(om.ExplicitComponent):
+    corn_features = ['year','May_P','Jul_T','Jul_ppt','Jul_ppt_sq','June_ppt']
+    soy_features = ['year','JulAug_T','JulAug_ppt','JulAug_ppt_sq','June_ppt']
+    
+    def __init__(self, data_dir=data_dir, year=2020):
+        # load corn yield data -----------
+        dfC = pd.read_csv(os.path.join(data_dir, 'Corn_y_model_data_v2.csv'))
+        dfS = pd.read_csv(os.path.join(data_dir, 'Soy_y_model_data_v2.csv'))
+        
+        # Create linear regression object for corn -----------
+        regrC = linear_model.LinearRegression()
+        regrC.fit(dfC[self.corn_features].values, dfC['corn_yield'].values)
+        
+        # Create linear regression object for soybean
+        regrS = linear_model.LinearRegression()
+        regrS.fit(dfS[self.soy_features].values, dfS['soy_yield'].values)
+        
+        self.year = year
+        self.coef_c, self.intercept_c = regrC.coef_, regrC.intercept_
+        self.coef_s, self.intercept_s = regrS.coef_, regrS.intercept_
+        
+    def predict(self, x0):
         """
-        Weather crop yield model: compute corn and soybean yield
+        Corn and soy yield (bu/acre) for weather data x0, a single vector 
+        or an (n, 5) array of 'May_P','Jul_T','Jul_ppt','Jul_ppt_sq','June_ppt'
         """
-        def setup(self):
-            # i/p 
-            self.add_input('w', val=np.ones(5)) 
-            
-            # o/p 
-            self.add_output('y_c', val= 0)            # Corn yield (busheles/Acres) 
-            self.add_output('y_soy', val= 0)          # Soy yield (busheles/Acres) 
+        x0 = np.asarray(x0)
+        year = np.full(x0.shape[:-1] + (1,), self.year, dtype=float)
         
-        def compute(self, inputs, outputs):            
-            yc,ys = corn_soy_weather(w)
-            
-            outputs['y_c'] = yc
-            outputs['y_soy'] = ys            
-    
-    class Agriculture(om.ExplicitComponent):
+        x = np.concatenate((year, x0), axis=-1)
+        xs = np.concatenate((year, x0[..., 1:]), axis=-1)
+        y_c = x.dot(self.coef_c) + self.intercept_c
+        y_s = xs.dot(self.coef_s) + self.intercept_s
+        
+        return y_c,y_s
+        
+    def jacobian(self):
         """
-        Agriculture: Computes FN, GN, CN, P_corn
+        Derivatives of corn and soy yield with respect to the 5 weather data,
+        constant since both regressions are linear
         """
-        def setup(self):
-            # i/p 
-            self.add_input('y_c', val= 0)            # Corn yield (busheles/Acres) 
-            self.add_input('y_soy', val= 0)          # Soy yield (busheles/Acres) 
-            self.add_input('RCN_corn', val= 0)       # rate of commercial N kg/ha
-            self.add_input('RCN_soy', val= 0)        # rate of commercial N kg/ha
-                    
-            # o/p 
-            self.add_output('P_corn', val=1.0)      # Corn production (busheles)
-            self.add_output('P_soy', val=1.0)       # Soy production (busheles)
-            self.add_output('CN', val=1.0)          # CN
-            self.add_output('FN', val=1.0)          # FN
-            self.add_output('GN', val=1.0)          # GN
-            
-                    
-            # Finite difference all partials.
-            self.declare_partials('*', '*', method='fd')
-    
-        def compute(self, inputs, outputs):
-            """
-            Evaluates P_corn, C_corn
-            """                   
-            #  1 bushels/acre = 67.25 kg/ha
+        dy_c = self.coef_c[1:]
+        dy_s = np.hstack((0, self.coef_s[1:]))
+        
+        return dy_c,dy_s
+
+
+# yield model shared by all calls in this process (fitted on first use)
+_yield_model = None
+
+
+def get_yield_model():
+    global _yield_model
+    if _yield_model is None:
+        _yield_model = WeatherYieldModel()
     
-            y_c = inputs['y_c']                 # corn yield bushels/acre
-            y_soy = inputs['y_soy']             # soy yield bushels/acre
-            
-            RCN_corn = inputs['RCN_corn']       # kg/ha  # rate of commercial N /ha
-            RCN_soy = inputs['RCN_soy']         # kg/ha  # rate of commercial N /ha
-            
-            A_corn  = 13500 * 1e3               # Acres planted (acres)  2019 data
-            A_soy   = 9200 * 1e3                # Area planted (acres)   2019 data        
-            A = (A_corn + A_soy)
-            AH_corn  = 13050 * 1e3               # Acres harvested (acres)  2019 data
-            AH_soy   = 9120 * 1e3                # Area harvested (acres)   2019 data        
-            AH = (AH_corn + AH_soy)
-                    
-            outputs['P_corn'] = y_c * A_corn    # bushels 
-            outputs['P_soy'] = y_soy * A_soy    # bushels 
-                    
-            # (1 bushels/acre = 67.25 kg/ha)
-            outputs['FN'] = (81.1 *  (y_soy*67.25/1000) - 98.5)*A_soy / A                 # N kg/ha
-            
-            outputs['GN'] = ((y_c*67.25)*(1.18/100) *AH_corn + (y_soy*67.25)*(6.4/100)* AH_soy)/AH   # N kg/ha
+    return _yield_model
+
+
+def corn_soy_weather(x0):
+    #x0 = 'May_P','Jul_T','Jul_ppt','Jul_ppt_sq','June_ppt'    
+    return get_yield_model().predict(x0)
+
+
+# ------------------- Model equations ------------------------------------------
+# Closed-form equations shared by the OpenMDAO components and IFEW_batch(), 
+# inputs can be scalars or arrays of scenarios
+
+#  1 bushels/acre = 67.25 kg/ha
+A_corn  = 13500 * 1e3               # Acres planted (acres)  2019 data
+A_soy   = 9200 * 1e3                # Area planted (acres)   2019 data        
+A = (A_corn + A_soy)
+AH_corn  = 13050 * 1e3              # Acres harvested (acres)  2019 data
+AH_soy   = 9120 * 1e3               # Area harvested (acres)   2019 data        
+AH = (AH_corn + AH_soy)
+
+EtOH_Dry = 2.7      # gal EtOH/bushels (Dry grind mills)
+WCR = 3             # gal water / gal of Ethanol
+
+# life cycle days
+lf_Beef = 365   
+lf_Milk = 365   
+lf_HS = 365              # Heifer/steer
+lf_Slught_Catt = 170     # Slught Catt
+lf_Hog = 365
+
+# N kg /day per animal
+N_Beef = 0.15
+N_Milk = 0.204   
+N_HS = 0.1455     # Heifer/steer
+N_Slught_Catt = 0.104     # 
+N_HOG = 0.027
+
+
+def agriculture(y_c, y_soy, RCN_corn, RCN_soy):
+    """
+    Agriculture: P_corn, P_soy (bushels), CN, FN, GN (N kg/ha)
+    """
+    P_corn = y_c * A_corn    # bushels 
+    P_soy = y_soy * A_soy    # bushels 
             
-            outputs['CN'] = (RCN_corn*A_corn + RCN_soy*A_soy )/ A  # N kg/ha
-           
+    # (1 bushels/acre = 67.25 kg/ha)
+    FN = (81.1 *  (y_soy*67.25/1000) - 98.5)*A_soy / A                 # N kg/ha
     
-    class EtOH_Prod(om.ExplicitComponent):
-        """
-        ETOH production
-        """
-        def setup(self):
-            
-            # input
-            self.add_input('P_corn_EtOH', val=1.0)       # corn production for EtOH (bushels)
-            
-            # output 
-            self.add_output('P_EtOH', val=1.0)          # Ethanol production (mil/gal)
-            self.add_output('WC_EtOH', val=1.0)
+    GN = ((y_c*67.25)*(1.18/100) *AH_corn + (y_soy*67.25)*(6.4/100)* AH_soy)/AH   # N kg/ha
     
-            # Finite difference all partials.
-            self.declare_partials('*', '*', method='fd')
+    CN = (RCN_corn*A_corn + RCN_soy*A_soy )/ A  # N kg/ha
     
-        def compute(self, inputs, outputs):
-            EtOH_Dry = 2.7      # gal EtOH/bushels (Dry grind mills)
-            WCR = 3             # gal water / gal of Ethanol
-            
-            outputs['P_EtOH'] = inputs['P_corn_EtOH']*EtOH_Dry  # gal od EtOH production                
-            outputs['WC_EtOH'] = outputs['P_EtOH'] * WCR
-            
-            
-    class Animal_Ag(om.ExplicitComponent):
-        """
-        Animal Agriculture: computes MN
-        """
-        def setup(self):
-            #input
-            self.add_input('Catt', val=np.array([1.0, 1.0, 1.0]))
-            self.add_input('Hog', val=1.0)
-            
-            # output
-            self.add_output('MN', val=1.0)
-            
-            # Finite difference all partials.
-            self.declare_partials('*', '*', method='fd')
+    return P_corn, P_soy, CN, FN, GN
+
+
+def etoh_prod(P_corn_EtOH):
+    """
+    ETOH production: P_EtOH (gal) and water consumption WC_EtOH (gal)
+    """
+    P_EtOH = P_corn_EtOH*EtOH_Dry  # gal od EtOH production                
+    WC_EtOH = P_EtOH * WCR
     
-        def compute(self, inputs, outputs):
-            # life cycle days
-            lf_Beef = 365   
-            lf_Milk = 365   
-            lf_HS = 365              # Heifer/steer
-            lf_Slught_Catt = 170     # Slught Catt
-            lf_Hog = 365
-            
-            # N kg /day per animal
-            N_Beef = 0.15
-            N_Milk = 0.204   
-            N_HS = 0.1455     # Heifer/steer
-            N_Slught_Catt = 0.104     # 
-            N_HOG = 0.027
-            
-            A_corn  = 13500 * 1e3       # Acres planted (acres)  2019 data
-            A_soy = 9200 * 1e3          # Area planted (acres)   2019 data        
-            A = (A_corn + A_soy)
-                    
-            Catt_Beef = inputs['Catt'][0]
-            Catt_Milk = inputs['Catt'][1]
-            Catt_Othr = inputs['Catt'][2]
-            
-            Hog = inputs['Hog']
-            
-            Total_Catt_N = Catt_Beef*N_Beef*lf_Beef + Catt_Milk*N_Milk*lf_Milk + \
-                           0.5*Catt_Othr*N_HS*lf_HS + 0.5*Catt_Othr*N_Slught_Catt*lf_Slught_Catt
-            
-            Total_Hog_N = Hog * N_HOG * lf_Hog
-            
-            outputs['MN'] = (Total_Catt_N + Total_Hog_N)/A  # N kg/ha
+    return P_EtOH, WC_EtOH
+
+
+def animal_ag(Hog, Catt_Beef, Catt_Milk, Catt_Othr):
+    """
+    Animal Agriculture: MN (N kg/ha)
+    """
+    Total_Catt_N = Catt_Beef*N_Beef*lf_Beef + Catt_Milk*N_Milk*lf_Milk + \
+                   0.5*Catt_Othr*N_HS*lf_HS + 0.5*Catt_Othr*N_Slught_Catt*lf_Slught_Catt
+    
+    Total_Hog_N = Hog * N_HOG * lf_Hog
     
+    return (Total_Catt_N + Total_Hog_N)/A  # N kg/ha
+
+
+def n_surplus(CN, MN, FN, GN):
+    """
+    Nitrogen surplus in soil (N kg/ha)
+    """
+    return (CN  + MN + FN - GN )  # N kg/ha
+
+
+def demand_corn(D_Corn, P_corn, P_corn_EtOH):
+    """
+    Constraint 1 - used for future calculations
+    """
+    return D_Corn - (P_corn - P_corn_EtOH )
+
+
+def demand_etoh(D_EtOH, P_EtOH):
+    """
+    Constraint 2 - used for future calculations
+    """
+    return D_EtOH - P_EtOH
+
+
+def demand_fp(D_catt_meat, D_Hog, Hog, Catt_Beef, Catt_Othr):
+    """
+    Constraint 3 and 4 - used for future calculations
+    """
+    const3 = D_catt_meat  - ( Catt_Beef + 0.5 * Catt_Othr)
+    const4 = D_Hog - Hog
     
-    class N_surplus(om.ExplicitComponent):
+    return const3, const4
+
+
+# Fixed inputs of the model
+P_corn_EtOH = 10e6              # corn production for EtOH (bushels)
+D_EtOH = 4350*1e6               # mil gal
+D_Corn = 100*1e6                # bushels
+D_catt_meat = 1e5               # bushels
+D_Hog = 10e5                    # bushels
+
+
+# ------------------- OpenMDAO components --------------------------------------
+# Every component takes a 'vec_size' option: inputs and outputs are arrays of 
+# vec_size scenarios, so a single run_model() evaluates a whole sample batch.
+# Scenarios are independent, partials are declared diagonal (sparse) with 
+# their exact constant values.
+
+class VecComponent(om.ExplicitComponent):
+    """
+    Explicit component evaluating vec_size independent scenarios
+    """
+    def initialize(self):
+        self.options.declare('vec_size', types=int, default=1, desc='number of scenarios')
+        
+    def declare_diag(self, of, wrt, val):
         """
-        Nitrogen surplus in soil
+        Declare a constant diagonal partial d(of)/d(wrt) for (n,) variables
         """
-        def setup(self):
-            # input 
-            self.add_input('MN', val=1.0)
-            self.add_input('FN', val=1.0)
-            self.add_input('GN', val=1.0)
-            self.add_input('CN', val=1.0)
-            
-            # output
-            self.add_output('N_surplus', val=1.0)
-    
-            # Finite difference all partials.
-            self.declare_partials('*', '*', method='fd')
-    
-        def compute(self, inputs, outputs):     
-            outputs['N_surplus'] = (inputs['CN']  + inputs['MN'] + inputs['FN'] - inputs['GN'] )  # N kg/ha
-    
-            
-    class Demand_Corn(om.ExplicitComponent):
+        ar = np.arange(self.options['vec_size'])
+        self.declare_partials(of, wrt, rows=ar, cols=ar, val=val)
+        
+    def declare_rows(self, of, wrt, vals):
         """
-        Constraint 1 - used for future calculations
+        Declare constant partials d(of)/d(wrt) for (n, m) wrt such as Catt or w,
+        vals are the m derivatives of each scenario (zeros are not stored)
         """
-        def setup(self):
-            # input         
-            self.add_input('P_corn', val=1.0)
-            self.add_input('P_corn_EtOH', val=1.0)
-            self.add_input('D_Corn', val=1.0)
-            
-            # output
-            self.add_output('const1', val=1.0)
-              
-            # Finite difference all partials.
-            self.declare_partials('*', '*', method='fd')
-    
-        def compute(self, inputs, outputs):
+        n = self.options['vec_size']
+        vals = np.asarray(vals, dtype=float)
+        j = np.nonzero(vals)[0]
+        rows = np.repeat(np.arange(n), len(j))
+        cols = (len(vals)*np.arange(n)[:,None] + j).ravel()
+        self.declare_partials(of, wrt, rows=rows, cols=cols, val=np.tile(vals[j], n))
+
+
+class Weather_crop_yield(VecComponent):
+    """
+    Weather crop yield model: compute corn and soybean yield
+    """
+    def setup(self):
+        n = self.options['vec_size']
+        
+        # i/p 
+        self.add_input('w', val=np.ones((n,5))) 
+        
+        # o/p 
+        self.add_output('y_c', val=np.zeros(n))            # Corn yield (busheles/Acres) 
+        self.add_output('y_soy', val=np.zeros(n))          # Soy yield (busheles/Acres) 
+        
+        # Partials of the (linear) yield regressions
+        dy_c, dy_s = get_yield_model().jacobian()
+        self.declare_rows('y_c', 'w', dy_c)
+        self.declare_rows('y_soy', 'w', dy_s)
     
-            outputs['const1'] =  inputs['D_Corn'] - (inputs['P_corn'] - inputs['P_corn_EtOH'] )
+    def compute(self, inputs, outputs):            
+        yc,ys = corn_soy_weather(inputs['w'])
+        
+        outputs['y_c'] = yc
+        outputs['y_soy'] = ys            
+
+
+class Agriculture(VecComponent):
+    """
+    Agriculture: Computes FN, GN, CN, P_corn
+    """
+    def setup(self):
+        n = self.options['vec_size']
+        
+        # i/p 
+        self.add_input('y_c', val=np.zeros(n))            # Corn yield (busheles/Acres) 
+        self.add_input('y_soy', val=np.zeros(n))          # Soy yield (busheles/Acres) 
+        self.add_input('RCN_corn', val=np.zeros(n))       # rate of commercial N kg/ha
+        self.add_input('RCN_soy', val=np.zeros(n))        # rate of commercial N kg/ha
+                
+        # o/p 
+        self.add_output('P_corn', val=np.ones(n))      # Corn production (busheles)
+        self.add_output('P_soy', val=np.ones(n))       # Soy production (busheles)
+        self.add_output('CN', val=np.ones(n))          # CN
+        self.add_output('FN', val=np.ones(n))          # FN
+        self.add_output('GN', val=np.ones(n))          # GN
+        
+        # Partials
+        self.declare_diag('P_corn', 'y_c', A_corn)
+        self.declare_diag('P_soy', 'y_soy', A_soy)
+        self.declare_diag('FN', 'y_soy', 81.1*67.25/1000*A_soy/A)
+        self.declare_diag('GN', 'y_c', 67.25*(1.18/100)*AH_corn/AH)
+        self.declare_diag('GN', 'y_soy', 67.25*(6.4/100)*AH_soy/AH)
+        self.declare_diag('CN', 'RCN_corn', A_corn/A)
+        self.declare_diag('CN', 'RCN_soy', A_soy/A)
+
+    def compute(self, inputs, outputs):
+        """
+        Evaluates P_corn, C_corn
+        """                   
+        P_corn, P_soy, CN, FN, GN = agriculture(inputs['y_c'], inputs['y_soy'],
+                                                inputs['RCN_corn'], inputs['RCN_soy'])
+        
+        outputs['P_corn'] = P_corn    # bushels 
+        outputs['P_soy'] = P_soy      # bushels 
+        outputs['FN'] = FN            # N kg/ha
+        outputs['GN'] = GN            # N kg/ha
+        outputs['CN'] = CN            # N kg/ha
+
+
+class EtOH_Prod(VecComponent):
+    """
+    ETOH production
+    """
+    def setup(self):
+        n = self.options['vec_size']
+        
+        # input
+        self.add_input('P_corn_EtOH', val=np.ones(n))       # corn production for EtOH (bushels)
+        
+        # output 
+        self.add_output('P_EtOH', val=np.ones(n))          # Ethanol production (mil/gal)
+        self.add_output('WC_EtOH', val=np.ones(n))
+
+        # Partials
+        self.declare_diag('P_EtOH', 'P_corn_EtOH', EtOH_Dry)
+        self.declare_diag('WC_EtOH', 'P_corn_EtOH', EtOH_Dry*WCR)
+
+    def compute(self, inputs, outputs):
+        outputs['P_EtOH'], outputs['WC_EtOH'] = etoh_prod(inputs['P_corn_EtOH'])
+
+
+class Animal_Ag(VecComponent):
+    """
+    Animal Agriculture: computes MN
+    """
+    def setup(self):
+        n = self.options['vec_size']
+        
+        #input
+        self.add_input('Catt', val=np.ones((n,3)))
+        self.add_input('Hog', val=np.ones(n))
+        
+        # output
+        self.add_output('MN', val=np.ones(n))
+        
+        # Partials
+        self.declare_diag('MN', 'Hog', N_HOG*lf_Hog/A)
+        self.declare_rows('MN', 'Catt', [N_Beef*lf_Beef/A, N_Milk*lf_Milk/A,
+                                 (0.5*N_HS*lf_HS + 0.5*N_Slught_Catt*lf_Slught_Catt)/A])
+
+    def compute(self, inputs, outputs):
+        Catt_Beef = inputs['Catt'][:,0]
+        Catt_Milk = inputs['Catt'][:,1]
+        Catt_Othr = inputs['Catt'][:,2]
+        
+        outputs['MN'] = animal_ag(inputs['Hog'], Catt_Beef, Catt_Milk, Catt_Othr)  # N kg/ha
+
+
+class N_surplus(VecComponent):
+    """
+    Nitrogen surplus in soil
+    """
+    def setup(self):
+        n = self.options['vec_size']
+        
+        # input 
+        self.add_input('MN', val=np.ones(n))
+        self.add_input('FN', val=np.ones(n))
+        self.add_input('GN', val=np.ones(n))
+        self.add_input('CN', val=np.ones(n))
+        
+        # output
+        self.add_output('N_surplus', val=np.ones(n))
+
+        # Partials
+        self.declare_diag('N_surplus', 'CN', 1.0)
+        self.declare_diag('N_surplus', 'MN', 1.0)
+        self.declare_diag('N_surplus', 'FN', 1.0)
+        self.declare_diag('N_surplus', 'GN', -1.0)
+
+    def compute(self, inputs, outputs):     
+        outputs['N_surplus'] = n_surplus(inputs['CN'], inputs['MN'], inputs['FN'], inputs['GN'])  # N kg/ha
+
+
+class Demand_Corn(VecComponent):
+    """
+    Constraint 1 - used for future calculations
+    """
+    def setup(self):
+        n = self.options['vec_size']
+        
+        # input         
+        self.add_input('P_corn', val=np.ones(n))
+        self.add_input('P_corn_EtOH', val=np.ones(n))
+        self.add_input('D_Corn', val=np.ones(n))
+        
+        # output
+        self.add_output('const1', val=np.ones(n))
+          
+        # Partials
+        self.declare_diag('const1', 'D_Corn', 1.0)
+        self.declare_diag('const1', 'P_corn', -1.0)
+        self.declare_diag('const1', 'P_corn_EtOH', 1.0)
+
+    def compute(self, inputs, outputs):
+
+        outputs['const1'] = demand_corn(inputs['D_Corn'], inputs['P_corn'], inputs['P_corn_EtOH'])
+
+
+class Demand_EtOH(VecComponent):
+    """
+    Constraint 2 - used for future calculations
+    """
+    def setup(self):
+        n = self.options['vec_size']
+        
+        # input
+        self.add_input('P_EtOH', val=np.ones(n))
+        self.add_input('D_EtOH', val=np.ones(n))
+        
+        # output
+        self.add_output('const2', val=np.ones(n))
+        
+        # Partials
+        self.declare_diag('const2', 'D_EtOH', 1.0)
+        self.declare_diag('const2', 'P_EtOH', -1.0)
+
+    def compute(self, inputs, outputs):
+
+        outputs['const2'] = demand_etoh(inputs['D_EtOH'], inputs['P_EtOH'])
+
+
+class Demand_FP(VecComponent):
+    """
+    Constraint 3 - used for future calculations
+    """
+    def setup(self):
+        n = self.options['vec_size']
+        
+        # input
+        self.add_input('D_catt_meat', val=np.ones(n))
+        self.add_input('D_Hog', val=np.ones(n))
+        
+        self.add_input('Catt', val=np.ones((n,3)))
+        self.add_input('Hog', val=np.ones(n))
+        
+        # output 
+        self.add_output('const3', val=np.ones(n))
+        self.add_output('const4', val=np.ones(n))
+        
+        # Partials
+        self.declare_diag('const3', 'D_catt_meat', 1.0)
+        self.declare_rows('const3', 'Catt', [-1.0, 0.0, -0.5])
+        self.declare_diag('const4', 'D_Hog', 1.0)
+        self.declare_diag('const4', 'Hog', -1.0)
+
+    def compute(self, inputs, outputs):
+
+        Catt_Beef = inputs['Catt'][:,0]
+        Catt_Othr = inputs['Catt'][:,2]
+        
+        outputs['const3'], outputs['const4'] = demand_fp(inputs['D_catt_meat'], inputs['D_Hog'],
+                                                         inputs['Hog'], Catt_Beef, Catt_Othr)
+
+
+class SellarMDA(om.Group):
+    """
+    Group containing the Sellar MDA.
+    """
+    def initialize(self):
+        self.options.declare('vec_size', types=int, default=1, desc='number of scenarios')
+        
+    def setup(self):
+        n = self.options['vec_size']
+        
+        # Design variables
+        indeps = self.add_subsystem('indeps', om.IndepVarComp(), promotes=['*'])
+        
+        indeps.add_output('w', np.ones((n,5)))  
+        
+        # indeps.add_output('y_c', 1)
+        # indeps.add_output('y_soy', 1)
+        indeps.add_output('RCN_corn', np.ones(n))
+        indeps.add_output('RCN_soy', np.ones(n))      
+        indeps.add_output('Hog', np.ones(n))                 
+        indeps.add_output('Catt', np.ones((n,3)))
+
+
+        
+        indeps.add_output('P_corn_EtOH', np.full(n, P_corn_EtOH))           
+        indeps.add_output('D_EtOH', np.full(n, 1e6))            
+        indeps.add_output('D_Corn', np.full(n, 20000.))       
+        indeps.add_output('D_catt_meat', np.full(n, 10.))
+        indeps.add_output('D_Hog', np.full(n, 10.))
+                
+        # Connections    
+        self.add_subsystem('Weather_crop_yield', Weather_crop_yield(vec_size=n), promotes_inputs=['w'], promotes_outputs=['y_c', 'y_soy'])
+        self.add_subsystem('Agriculture', Agriculture(vec_size=n), promotes_inputs=['y_c','y_soy','RCN_corn','RCN_soy'], promotes_outputs=['CN', 'GN', 'FN','P_corn'])
+        self.add_subsystem('EtOH_Prod', EtOH_Prod(vec_size=n), promotes_inputs=['P_corn_EtOH'], promotes_outputs=['P_EtOH','WC_EtOH'])        
+        self.add_subsystem('Animal_Ag', Animal_Ag(vec_size=n), promotes_inputs=['Catt','Hog'], promotes_outputs=['MN'])
+        
+        # Objective function
+        self.add_subsystem('Obj', N_surplus(vec_size=n), promotes_inputs=['CN', 'GN', 'FN', 'MN'], promotes_outputs = ['N_surplus'])
+
+
+        # Constraints function
+        self.add_subsystem('con_Demand_Corn', Demand_Corn(vec_size=n), promotes_inputs=['D_Corn','P_corn','P_corn_EtOH'],promotes_outputs=['const1'])
+        self.add_subsystem('con_Demand_EtOH', Demand_EtOH(vec_size=n), promotes_inputs=['P_EtOH','D_EtOH'], promotes_outputs=['const2'])
+        self.add_subsystem('con_Demand_FP', Demand_FP(vec_size=n), promotes_inputs=['D_catt_meat', 'D_Hog', 'Catt','Hog'], promotes_outputs=['const3','const4'])
+
+
+class IFEWModel(object):
+    """
+    Reusable IFEWs model: the OpenMDAO problem is built and set up once,
+    each evaluate() call only updates the inputs and runs the model.
+    With vec_size = n, evaluate_batch() runs n scenarios in one run_model()
+    """
+    design_vars = ['RCN_corn', 'RCN_soy', 'Hog', 'Catt']
     
+    def __init__(self, vec_size=1):
+        self.vec_size = vec_size
+        
+        prob = om.Problem()
+        prob.model = SellarMDA(vec_size=vec_size)
             
-    class Demand_EtOH(om.ExplicitComponent):
+        prob.model.add_objective('N_surplus')
+        
+        # Design variables (rates of commercial N and livestock)
+        for name in self.design_vars:
+            prob.model.add_design_var(name)
+        
+        # Add constraint 
+        prob.model.add_constraint('const1',  upper=0 )
+        prob.model.add_constraint('const2',  upper=0)
+        prob.model.add_constraint('const3',  upper=0)
+        prob.model.add_constraint('const4',  upper=0)
+            
+        prob.setup()
+                
+        prob.set_val('indeps.D_EtOH', np.full(vec_size, D_EtOH))            # mil gal
+        prob.set_val('indeps.D_Corn', np.full(vec_size, D_Corn))            # bushels
+        prob.set_val('indeps.D_catt_meat', np.full(vec_size, D_catt_meat))  # bushels
+        prob.set_val('indeps.D_Hog', np.full(vec_size, D_Hog))              # bushels
+        
+        self.prob = prob
+        
+    def set_inputs(self, X, W):
         """
-        Constraint 2 - used for future calculations
+        Set (vec_size, 6) input variables X and (vec_size, 5) weather data W
         """
-        def setup(self):
-            # input
-            self.add_input('P_EtOH', val=1.0)
-            self.add_input('D_EtOH', val=1.0)
-            
-            # output
-            self.add_output('const2', val=1.0)
-            
-            # Finite difference all partials.
-            self.declare_partials('*', '*', method='fd')
-    
-        def compute(self, inputs, outputs):
-    
-            outputs['const2'] =  inputs['D_EtOH'] - inputs['P_EtOH']
-            
-            
-    class Demand_FP(om.ExplicitComponent):
+        X = np.reshape(np.asarray(X, dtype=float), (self.vec_size, 6))
+        W = np.reshape(np.asarray(W, dtype=float), (self.vec_size, 5))
+        prob = self.prob
+        
+        prob.set_val('indeps.w', W)                    # weather data input
+        prob.set_val('indeps.RCN_corn', X[:,0])        # kg/ha
+        prob.set_val('indeps.RCN_soy', X[:,1])         # kg/ha    
+        prob.set_val('indeps.Hog', X[:,2])             # population of Hog
+        prob.set_val('indeps.Catt', X[:,3:])           # population of cattles
+        
+    def evaluate(self, x, w, display=False):
         """
-        Constraint 3 - used for future calculations
+        Evaluate the model for input variable x and weather data w
         """
-        def setup(self):
-            # input
-            self.add_input('D_catt_meat', val=1.0)
-            self.add_input('D_Hog', val=1.0)
-            
-            self.add_input('Catt', val=np.array([1.0, 1.0, 1.0]))
-            self.add_input('Hog', val=1.0)
-            
-            # output 
-            self.add_output('const3', val=1.0)
-            self.add_output('const4', val=1.0)
-            
-            # Finite difference all partials.
-            self.declare_partials('*', '*', method='fd')
-    
-        def compute(self, inputs, outputs):
-    
-            Catt_Beef = inputs['Catt'][0]
-            Catt_Othr = inputs['Catt'][2]
-            
-            outputs['const3'] =  inputs['D_catt_meat']  - ( Catt_Beef + 0.5 * Catt_Othr)
-            outputs['const4'] =  inputs['D_Hog'] - inputs['Hog']
-            
-            
-            
-    class SellarMDA(om.Group):
+        prob = self.prob
+        
+        self.set_inputs(x, w)
+        prob.run_model()
+        
+        if display == True:
+            print('\n Agriculture ----------------------------')
+            print('y_c (bu/acre)=',prob['y_c'][0])
+            print('P_corn (bu) =',prob['P_corn'][0])
+            print('y_soy (bu/acre)=',prob['y_soy'][0])
+            
+            print('\n EtOH Production ----------------------------')
+            print('P_EtOH (gal) =',prob['P_EtOH'][0])
+            print('P_corn_EtOH (bu) =',prob['P_corn_EtOH'][0])
+            print('WC_EtOH (gal) =',prob['WC_EtOH'][0])
+            #
+            print('\n Animal Ag ----------------------------')
+            print('Catt (population)=',prob['Catt'][0])
+            print('Hog (population)=',prob['Hog'][0])
+                
+            print('\n N_surplus ----------------------------')
+            print('MN (kg/ha)=',prob['MN'][0])
+            print('CN (kg/ha)=',prob['CN'][0])
+            print('FN (kg/ha)=',prob['FN'][0])
+            print('GN (kg/ha)=',prob['GN'][0])
+            print('N_surplus (kg/ha)=',prob['N_surplus'][0])
+            #
+            print('\n Constraint (used for future calculations) ----------')
+            print('const1  : con_Demand_Corn ',prob['const1'])
+            print('const2  : con_Demand_EtOH',prob['const2'])
+            print('const3  : con_Demand_FP_Catt',prob['const3'])
+            print('const4  : con_Demand_FP_Hog',prob['const4'])
+            
+        ## Part-5: Generate N2 diagram -----
+        # from openmdao.api import n2; n2(prob)
+        
+        return prob['N_surplus'][0],prob['y_c'][0],prob['y_soy'][0],prob['CN'][0],prob['MN'][0],prob['FN'][0],prob['GN'][0] 
+        
+    def evaluate_batch(self, X, W):
         """
-        Group containing the Sellar MDA.
+        Evaluate vec_size scenarios in one run_model(), returns a dict of 
+        (vec_size,) arrays with the same keys as IFEW_batch()
         """
-        def setup(self):
-            
-            # Design variables
-            indeps = self.add_subsystem('indeps', om.IndepVarComp(), promotes=['*'])
-            
-            indeps.add_output('w', np.ones(5))  
-            
-            # indeps.add_output('y_c', 1)
-            # indeps.add_output('y_soy', 1)
-            indeps.add_output('RCN_corn', 1)
-            indeps.add_output('RCN_soy', 1)      
-            indeps.add_output('Hog', 1)                 
-            indeps.add_output('Catt', np.ones(3))
-
-
-            
-            indeps.add_output('P_corn_EtOH', 10e6)           
-            indeps.add_output('D_EtOH', 1e6)            
-            indeps.add_output('D_Corn', 20000)       
-            indeps.add_output('D_catt_meat',10)
-            indeps.add_output('D_Hog',10)
-                    
-            # Connections    
-            self.add_subsystem('Weather_crop_yield', Weather_crop_yield(), promotes_inputs=['w'], promotes_outputs=['y_c', 'y_soy'])
-            self.add_subsystem('Agriculture', Agriculture(), promotes_inputs=['y_c','y_soy','RCN_corn','RCN_soy'], promotes_outputs=['CN', 'GN', 'FN','P_corn'])
-            self.add_subsystem('EtOH_Prod', EtOH_Prod(), promotes_inputs=['P_corn_EtOH'], promotes_outputs=['P_EtOH','WC_EtOH'])        
-            self.add_subsystem('Animal_Ag', Animal_Ag(), promotes_inputs=['Catt','Hog'], promotes_outputs=['MN'])
-            
-            # Objective function
-            self.add_subsystem('Obj', N_surplus(), promotes_inputs=['CN', 'GN', 'FN', 'MN'], promotes_outputs = ['N_surplus'])
-    
-    
-            # Constraints function
-            self.add_subsystem('con_Demand_Corn', Demand_Corn(), promotes_inputs=['D_Corn','P_corn','P_corn_EtOH'],promotes_outputs=['const1'])
-            self.add_subsystem('con_Demand_EtOH', Demand_EtOH(), promotes_inputs=['P_EtOH','D_EtOH'], promotes_outputs=['const2'])
-            self.add_subsystem('con_Demand_FP', Demand_FP(), promotes_inputs=['D_catt_meat', 'D_Hog', 'Catt','Hog'], promotes_outputs=['const3','const4'])
-            
-            
-            
-    prob = om.Problem()
-    prob.model = SellarMDA()
+        prob = self.prob
         
-    prob.model.add_objective('N_surplus')
-    
-    # Add constraint 
-    prob.model.add_constraint('const1',  upper=0 )
-    prob.model.add_constraint('const2',  upper=0)
-    prob.model.add_constraint('const3',  upper=0)
-    prob.model.add_constraint('const4',  upper=0)
+        self.set_inputs(X, W)
+        prob.run_model()
         
-    prob.setup()
-            
-    prob.set_val('indeps.D_EtOH', 4350*1e6)      # mil gal
-    prob.set_val('indeps.D_Corn', 100*1e6)       # bushels
-    prob.set_val('indeps.D_catt_meat', 1e5)      # bushels
-    prob.set_val('indeps.D_Hog', 10e5)           # bushels
-        
-    prob.set_val('indeps.w', w)                    # weather data input
-    prob.set_val('indeps.RCN_corn', x[0])          # kg/ha
-    prob.set_val('indeps.RCN_soy', x[1])           # kg/ha    
-    prob.set_val('indeps.Hog', x[2])               # population of Hog
-    prob.set_val('indeps.Catt', np.array(x[3:]) )  # population of cattles
-    
-    
-    prob.run_model()
-    
-    if display == True:
-        print('\n Agriculture ----------------------------')
-        print('y_c (bu/acre)=',prob['y_c'][0])
-        print('P_corn (bu) =',prob['P_corn'][0])
-        print('y_soy (bu/acre)=',prob['y_soy'][0])
-        
-        print('\n EtOH Production ----------------------------')
-        print('P_EtOH (gal) =',prob['P_EtOH'][0])
-        print('P_corn_EtOH (bu) =',prob['P_corn_EtOH'][0])
-        print('WC_EtOH (gal) =',prob['WC_EtOH'][0])
-        #
-        print('\n Animal Ag ----------------------------')
-        print('Catt (population)=',prob['Catt'])
-        print('Hog (population)=',prob['Hog'][0])
-            
-        print('\n N_surplus ----------------------------')
-        print('MN (kg/ha)=',prob['MN'][0])
-        print('CN (kg/ha)=',prob['CN'][0])
-        print('FN (kg/ha)=',prob['FN'][0])
-        print('GN (kg/ha)=',prob['GN'][0])
-        print('N_surplus (kg/ha)=',prob['N_surplus'][0])
-        #
-        print('\n Constraint (used for future calculations) ----------')
-        print('const1  : con_Demand_Corn ',prob['const1'])
-        print('const2  : con_Demand_EtOH',prob['const2'])
-        print('const3  : con_Demand_FP_Catt',prob['const3'])
-        print('const4  : con_Demand_FP_Hog',prob['const4'])
-        
-
-    ## Part-5: Generate N2 diagram -----
-    # from openmdao.api import n2; n2(prob)
-    
-    return prob['N_surplus'][0],prob['y_c'][0],prob['y_soy'][0],prob['CN'][0],prob['MN'][0],prob['FN'][0],prob['GN'][0] 
+        names = ['N_surplus','y_c','y_soy','CN','MN','FN','GN','P_corn','P_EtOH','WC_EtOH',
+                 'const1','const2','const3','const4']
+        out = {name: prob.get_val(name).copy() for name in names}
+        out['P_soy'] = prob.get_val('Agriculture.P_soy').copy()
+        
+        return out
+        
+    def gradient(self, x, w):
+        """
+        Total derivatives of N_surplus and the constraints with respect to the 
+        design variables RCN_corn, RCN_soy, Hog and Catt, computed from the
+        analytic partials with one linear solve (no extra model runs)
+        """
+        prob = self.prob
+        
+        self.set_inputs(x, w)
+        prob.run_model()
+        
+        return prob.compute_totals(of=['N_surplus','const1','const2','const3','const4'], 
+                                   wrt=self.design_vars)
+
 
+# model shared by all IFEW() calls in this process (set up on first use)
+_model = None
 
 
+def IFEW(x,w,display):   
+    """
+    IFEWs function takes input variable x and weather data w 
+    and output important parameters of IFEWs model        
+    """
+    global _model
+    if _model is None:
+        _model = IFEWModel()
     
-   
\ No newline at end of file
+    return _model.evaluate(x, w, display)
+
+
+def IFEW_batch(X, W):
+    """
+    Vectorized IFEWs model: evaluates n scenarios at once without OpenMDAO
+    
+    X : (n, 6) array of [RCN_c, RCN_s, Hog, CAtt_B, CAtt_M, CAtt_O]
+    W : (n, 5) array of [May_P, Jul_T, Jul_ppt, Jul_ppt_sq, June_ppt]
+    
+    Returns a dict of (n,) arrays: N_surplus, y_c, y_soy, CN, MN, FN, GN,
+    P_corn, P_soy, P_EtOH, WC_EtOH and constraints const1 - const4
+    """
+    X = np.atleast_2d(np.asarray(X, dtype=float))
+    W = np.atleast_2d(np.asarray(W, dtype=float))
+    n = X.shape[0]
+    
+    RCN_corn, RCN_soy, Hog = X[:,0], X[:,1], X[:,2]
+    Catt_Beef, Catt_Milk, Catt_Othr = X[:,3], X[:,4], X[:,5]
+    
+    y_c, y_soy = corn_soy_weather(W)
+    P_corn, P_soy, CN, FN, GN = agriculture(y_c, y_soy, RCN_corn, RCN_soy)
+    P_EtOH, WC_EtOH = etoh_prod(np.full(n, P_corn_EtOH))
+    MN = animal_ag(Hog, Catt_Beef, Catt_Milk, Catt_Othr)
+    const3, const4 = demand_fp(D_catt_meat, D_Hog, Hog, Catt_Beef, Catt_Othr)
+    
+    return {'N_surplus': n_surplus(CN, MN, FN, GN),
+            'y_c': y_c, 'y_soy': y_soy,
+            'CN': CN, 'MN': MN, 'FN': FN, 'GN': GN,
+            'P_corn': P_corn, 'P_soy': P_soy, 
+            'P_EtOH': P_EtOH, 'WC_EtOH': WC_EtOH,
+            'const1': demand_corn(D_Corn, P_corn, P_corn_EtOH),
+            'const2': demand_etoh(D_EtOH, P_EtOH),
+            'const3': const3, 'const4': const4}
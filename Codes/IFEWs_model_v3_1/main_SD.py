@@ -18,7 +18,8 @@ import seaborn as sns
 
 # other codes
 from codes.prob_distrs import gen_exp
-from IFEWs_model_v3_1 import IFEW
+from parallel_sampling import run_samples
+from result_store import ResultStore
 
 if __name__ == '__main__':
 
@@ -39,68 +40,52 @@ if __name__ == '__main__':
     x_prob = collections.OrderedDict([('Gaussian_1', (74, 2)),
                                       ('Lognorm_1', (0.4,0, 4))  # shape,location, median
                                      ])                           
+    seed = 2021                     # fixed seed: reproducible sampling plan
+    np.random.seed(seed)
     w12 = gen_exp(x_sample, x_prob)
     
     # %% Case generation for SD ----------------    
     
-    data = np.empty(shape=(1,3),dtype='object')
     May_P = 80  # May planting progress 80% average (2009-2019)
     June_ppt = 5.5  # in of ppt 
     
-    for i in range(len(w12)):         
-        if i%1000==0 :  print('\n------ smpl-{} ------\n'.format(i))
-        Jul_T = w12[i,0]
-        Jul_ppt = w12[i,1]        
-        w = np.array([May_P, Jul_T, Jul_ppt, Jul_ppt**2, June_ppt])
-        N_surplus,yc,ys,CN,MN,FN,GN = IFEW(x,w, display=False)        
+    ns = len(w12)
+    Jul_T = w12[:,0]
+    Jul_ppt = w12[:,1]
+    W = np.column_stack((np.full(ns, May_P), Jul_T, Jul_ppt, Jul_ppt**2, np.full(ns, June_ppt)))
+    X = np.tile(x, (ns,1))
+    
+    # evaluate samples in chunks over all cores (results in sample order),
+    # chunks are saved as they finish and a restarted run skips finished ones
+    n_workers = None                # None: all cores
+    store = ResultStore('results/SD_seed{}_n{}'.format(seed, ns))
+    out = run_samples(X, W, n_workers=n_workers, chunk_size=10000, method='batch', store=store)
+    
+    # results in one preallocated table (one row per sample)
+    df0 = pd.DataFrame({'Jul_T': Jul_T, 'Jul_ppt': Jul_ppt, 'N_surplus': out['N_surplus'], 
+                        'y_corn': out['y_c'], 'y_soy': out['y_soy'], 
+                        'CN': out['CN'], 'MN': out['MN'], 'FN': out['FN'], 'GN': out['GN']})
         
-        if i ==0 :
-            data = np.array([Jul_T, Jul_ppt, N_surplus, yc, ys, CN, MN, FN, GN]).reshape(1,9)
-        else:
-            data =np.append(data, np.array([Jul_T, Jul_ppt, N_surplus, yc, ys, CN, MN, FN, GN]).reshape(1,9), axis=0 )
-        
-    n = data.shape[1]
     ## seperate data in different categories -----------
-    data1 = np.empty(shape=[0,n])
-    data2 = np.empty(shape=[0,n])
-    data3 = np.empty(shape=[0,n])
-    data4 = np.empty(shape=[0,n])
-    
     july_T = 76  
     july_P = 2.5 
-    for i in range(len(data)):
-        if data[i][0] <=july_T and  data[i][1] < july_P: # <76 , <2.5
-            data1 = np.append(data1, data[i].reshape(-1,n), axis=0 ) 
-        
-        elif data[i][0] <=july_T and  data[i][1] >=july_P: # <76 , >2.5
-            data2 = np.append(data2, data[i].reshape(-1,n), axis=0 ) 
-        
-        elif data[i][0] > july_T and  data[i][1] < july_P: # >76 , <2.5
-            data3 = np.append(data3, data[i].reshape(-1,n), axis=0 ) 
-             
-        elif data[i][0] > july_T and data[i][1] >=july_P: # >76 , >2.5
-            data4 = np.append(data4, data[i].reshape(-1,n), axis=0 ) 
+    # case-1: <76 , <2.5   case-2: <76 , >2.5   case-3: >76 , <2.5   case-4: >76 , >2.5
+    case_id = 1 + (df0['Jul_ppt'].to_numpy() >= july_P) + 2*(df0['Jul_T'].to_numpy() > july_T)
+    counts = np.bincount(case_id, minlength=5)
      
     # probability computation
     print('---- Probability-------')
-    print('case-1 : ', round((data1.shape[0]/data.shape[0]),2))
-    print('case-2 : ', round((data2.shape[0]/data.shape[0]),2))
-    print('case-3 : ', round((data3.shape[0]/data.shape[0]),2))
-    print('case-4 : ', round((data4.shape[0]/data.shape[0]),2))
+    for c in range(1,5):
+        print('case-{} : '.format(c), round((counts[c]/len(df0)),2))
 
      
      
     # %% Create dataframe for plotting with seaborn ----------- 
     
-    df0 = pd.DataFrame(data, columns = ['Jul_T','Jul_ppt','N_surplus','y_corn','y_soy','CN','MN','FN','GN'])
-    df1 = pd.DataFrame(data1, columns = ['Jul_T','Jul_ppt','N_surplus','y_corn','y_soy','CN','MN','FN','GN'])
-    df2 = pd.DataFrame(data2, columns = ['Jul_T','Jul_ppt','N_surplus','y_corn','y_soy','CN','MN','FN','GN'])
-    df3 = pd.DataFrame(data3, columns = ['Jul_T','Jul_ppt','N_surplus','y_corn','y_soy','CN','MN','FN','GN'])
-    df4 = pd.DataFrame(data4, columns = ['Jul_T','Jul_ppt','N_surplus','y_corn','y_soy','CN','MN','FN','GN'])
-
-    case = ['case1']*len(df1) + ['case2']*len(df2) + ['case3']*len(df3) + ['case4']*len(df4)    
-    dfo = pd.concat([df1,df2,df3,df4], ignore_index=True)
-    dfo['case'] = case
+    # samples grouped by case (case1 first), as expected by the stacked plots
+    order = np.argsort(case_id, kind='stable')
+    dfo = df0.iloc[order].reset_index(drop=True)
+    dfo['case'] = np.char.add('case', case_id[order].astype(str))
     
     sns.set_palette("pastel")
     fig, ax = plt.subplots(figsize=(14,8),dpi=50)
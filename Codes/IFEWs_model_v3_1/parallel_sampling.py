@@ -0,0 +1,130 @@
+# -*- coding: utf-8 -*-
+"""
+============================================
+Parallel sampling driver for the IFEWs model v3.1
+
+Evaluates large sample sets (e.g. the simulation decomposition study in
+main_SD.py) over a process pool. The samples are split in chunks of
+consecutive rows, each worker evaluates whole chunks and the results are
+written back at the chunk offsets, so the output order is the order of the
+samples whatever the number of workers or the completion order.
+
+method = 'batch'    : chunks are evaluated with IFEW_batch (NumPy)
+method = 'openmdao' : chunks are evaluated with IFEWModel(vec_size=chunk)
+
+With a ResultStore (result_store.py) every finished chunk is written to disk
+as soon as it completes and chunks already stored are skipped, so an
+interrupted run can be restarted.
+
+============================================
+"""
+
+import hashlib
+import os
+from concurrent.futures import ProcessPoolExecutor, as_completed
+
+import numpy as np
+
+import IFEWs_model_v3_1
+from IFEWs_model_v3_1 import IFEW_batch, IFEWModel, data_dir
+from result_store import fingerprint
+
+
+# OpenMDAO models already set up in this (worker) process, keyed by vec_size
+_models = {}
+
+
+def evaluate_chunk(X, W, method='batch'):
+    """
+    Evaluate one chunk of samples, returns a dict of (n,) arrays
+    """
+    if method == 'batch':
+        return IFEW_batch(X, W)
+
+    elif method == 'openmdao':
+        n = len(X)
+        if n not in _models:
+            _models[n] = IFEWModel(vec_size=n)
+        return _models[n].evaluate_batch(X, W)
+
+    raise ValueError("method must be 'batch' or 'openmdao', got {}".format(method))
+
+
+def _run_chunk(args):
+    start, X, W, method = args
+    return start, evaluate_chunk(X, W, method)
+
+
+def model_version():
+    """
+    Hash of the model source and its crop yield regression data
+    """
+    files = [IFEWs_model_v3_1.__file__] + [os.path.join(data_dir, f) for f in sorted(os.listdir(data_dir))
+                                           if f.endswith('.csv')]
+    h = hashlib.sha256()
+    for name in files:
+        with open(name, 'rb') as f:
+            h.update(f.read())
+    return h.hexdigest()
+
+
+def chunks(n, chunk_size):
+    """
+    (start, stop) row ranges of consecutive chunks covering n samples
+    """
+    return [(i, min(i + chunk_size, n)) for i in range(0, n, chunk_size)]
+
+
+def run_samples(X, W, n_workers=None, chunk_size=10000, method='batch', store=None):
+    """
+    Evaluate the (n, 6) input samples X with the (n, 5) weather samples W.
+
+    n_workers  : number of processes (None = all cores, 1 = no process pool)
+    chunk_size : number of samples per work unit
+    store      : optional ResultStore, finished chunks are streamed to it and
+                 chunks it already holds are not evaluated again (only if
+                 X, W, chunk_size, method and the model are unchanged)
+
+    Returns a dict of (n,) arrays in the original sample order
+    """
+    X = np.atleast_2d(np.asarray(X, dtype=float))
+    W = np.atleast_2d(np.asarray(W, dtype=float))
+    n = len(X)
+    if len(W) != n:
+        raise ValueError('X and W must have the same number of samples')
+
+    if n_workers is None:
+        n_workers = os.cpu_count() or 1
+
+    if store is not None:
+        store.bind(fingerprint(X, W, chunk_size=chunk_size, method=method, model=model_version()))
+
+    results = {}
+    def collect(start, out):
+        for name, val in out.items():
+            if name not in results:
+                results[name] = np.empty(n)
+            results[name][start:start + len(val)] = val
+
+    work = []
+    for start, stop in chunks(n, chunk_size):
+        if store is not None and store.is_done(start, stop):
+            collect(start, store.read(start, stop))
+        else:
+            work.append((start, X[start:stop], W[start:stop], method))
+
+    def finish(start, out):
+        if store is not None:
+            store.write(start, out)
+        collect(start, out)
+
+    if n_workers == 1 or len(work) <= 1:
+        for args in work:
+            finish(*_run_chunk(args))
+    else:
+        with ProcessPoolExecutor(max_workers=n_workers) as executor:
+            futures = [executor.submit(_run_chunk, args) for args in work]
+            for future in as_completed(futures):
+                finish(*future.result())
+
+    return results
@@ -0,0 +1,134 @@
+# -*- coding: utf-8 -*-
+"""
+============================================
+Streaming, resumable result store for long sampling runs
+
+Results are written chunk by chunk as NPZ shards in a results directory,
+together with a manifest (manifest.json) listing the finished sample ranges:
+
+ results_dir/
+   manifest.json                 {'key': ..., 'columns': [...], 'shards': [{'file', 'start', 'stop'}, ...]}
+   shard_0000000_0010000.npz     samples 0 - 9999
+   ...
+
+A shard is written to a temporary file first and only then renamed and
+recorded in the manifest, so a crash never leaves a partial shard listed.
+A restarted run skips the sample ranges already in the manifest.
+
+'key' is the fingerprint of the run the shards belong to (inputs, chunk size,
+method, model version - see parallel_sampling.run_samples). A run with another
+key resets the store, so results of other inputs or another model are never
+returned.
+
+============================================
+"""
+
+import hashlib
+import json
+import os
+import warnings
+
+import numpy as np
+
+
+def fingerprint(*arrays, **params):
+    """
+    Hash of arrays and parameters (JSON values) identifying the inputs of a run
+    """
+    h = hashlib.sha256()
+    for a in arrays:
+        a = np.ascontiguousarray(a)
+        h.update(str((a.dtype.str, a.shape)).encode('utf-8'))
+        h.update(a.tobytes())
+    h.update(json.dumps(params, sort_keys=True).encode('utf-8'))
+    return h.hexdigest()
+
+
+class ResultStore(object):
+    """
+    Append-only store of sample results in NPZ shards with a checkpoint manifest
+    """
+    def __init__(self, path):
+        self.path = path
+        self.manifest_file = os.path.join(path, 'manifest.json')
+        os.makedirs(path, exist_ok=True)
+
+        if os.path.exists(self.manifest_file):
+            with open(self.manifest_file) as f:
+                self.manifest = json.load(f)
+        else:
+            self.manifest = {'key': None, 'columns': [], 'shards': []}
+
+        self._done = {(s['start'], s['stop']) for s in self.manifest['shards']}
+
+    def bind(self, key):
+        """
+        Use the store for the run with fingerprint key, the shards of another
+        run are deleted
+        """
+        if self.manifest.get('key') == key:
+            return
+        if self.manifest['shards']:
+            warnings.warn('{} holds the results of other inputs or another model version, '
+                          'they are deleted'.format(self.path))
+            for s in self.manifest['shards']:
+                name = os.path.join(self.path, s['file'])
+                if os.path.exists(name):
+                    os.remove(name)
+        self.manifest = {'key': key, 'columns': [], 'shards': []}
+        self._done = set()
+        self._save_manifest()
+
+    def is_done(self, start, stop):
+        """
+        True if samples start - stop-1 are already stored
+        """
+        return (start, stop) in self._done
+
+    def write(self, start, results):
+        """
+        Store the results (dict of arrays) of the samples starting at index start
+        """
+        stop = start + len(next(iter(results.values())))
+        for s in self.manifest['shards']:
+            if start < s['stop'] and s['start'] < stop:
+                raise ValueError('Samples {} - {} overlap the stored samples {} - {}'
+                                 .format(start, stop - 1, s['start'], s['stop'] - 1))
+        name = 'shard_{:07d}_{:07d}.npz'.format(start, stop)
+        tmp = os.path.join(self.path, name + '.tmp')
+
+        with open(tmp, 'wb') as f:
+            np.savez(f, **results)
+        os.replace(tmp, os.path.join(self.path, name))
+
+        if not self.manifest['columns']:
+            self.manifest['columns'] = list(results)
+        self.manifest['shards'].append({'file': name, 'start': start, 'stop': stop})
+        self._done.add((start, stop))
+        self._save_manifest()
+
+    def read(self, start, stop):
+        """
+        Results of a stored chunk as a dict of arrays
+        """
+        name = 'shard_{:07d}_{:07d}.npz'.format(start, stop)
+        with np.load(os.path.join(self.path, name)) as data:
+            return {col: data[col] for col in data.files}
+
+    def load(self):
+        """
+        All stored results in sample order, returns (index, dict of arrays)
+        """
+        shards = sorted(self.manifest['shards'], key=lambda s: s['start'])
+        index = np.concatenate([np.arange(s['start'], s['stop']) for s in shards]) if shards else np.empty(0, int)
+        parts = [self.read(s['start'], s['stop']) for s in shards]
+        results = {col: np.concatenate([p[col] for p in parts]) if parts else np.empty(0)
+                   for col in self.manifest['columns']}
+
+        return index, results
+
+    def _save_manifest(self):
+        tmp = self.manifest_file + '.tmp'
+        with open(tmp, 'w') as f:
+            json.dump(self.manifest, f, indent=1)
+        os.replace(tmp, self.manifest_file)
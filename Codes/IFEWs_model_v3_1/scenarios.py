@@ -0,0 +1,75 @@
+# -*- coding: utf-8 -*-
+"""
+============================================
+Scenario table runner for the IFEWs model v3.1
+
+Builds one scenario per (district, year) by joining the animal agriculture
+data (animal_agriculture_data/IFEW.csv) with the PRISM weather data of the
+district station (weather_data/PRISM_201401_202001_sorted.csv), evaluates
+all scenarios in one pass and returns a table keyed by district and year
+with the model inputs and every model output. The weather features come
+from the cached (station, year) index of weather_features.py.
+
+============================================
+"""
+
+import numpy as np
+import pandas as pd
+
+from parallel_sampling import run_samples
+
+
+# Iowa agricultural districts (asd_desc) -> PRISM station (Name)
+district_station = {'NORTHWEST': 'NW', 'NORTH CENTRAL': 'NC', 'NORTHEAST': 'NE',
+                    'WEST CENTRAL': 'WC', 'CENTRAL': 'C', 'EAST CENTRAL': 'EC',
+                    'SOUTHWEST': 'SW', 'SOUTH CENTRAL': 'SC', 'SOUTHEAST': 'SE'}
+
+x_names = ['RCN_c', 'RCN_s', 'Hogs', 'BeefCows', 'MilkCows', 'OtherCattle']
+w_names = ['May_P', 'Jul_T', 'Jul_ppt', 'Jul_ppt_sq', 'June_ppt']
+
+
+def build_scenarios(df_AA, weather, RCN_c, RCN_s, May_P):
+    """
+    Join the animal agriculture rows with the weather of their district and
+    year (weather: weather_features.WeatherIndex), returns the scenario 
+    table with the model inputs x_names + w_names
+    """
+    scenarios = pd.DataFrame({'asd_code': df_AA['asd_code'],
+                              'District': df_AA['asd_desc'],
+                              'Name': df_AA['asd_desc'].map(district_station),
+                              'Year': pd.to_datetime(df_AA['Year'], format='%m/%d/%Y').dt.year})
+    if scenarios['Name'].isna().any():
+        missing = scenarios.loc[scenarios['Name'].isna(), 'District'].unique()
+        raise ValueError('No weather station for district(s) {}'.format(list(missing)))
+
+    scenarios['RCN_c'] = RCN_c
+    scenarios['RCN_s'] = RCN_s
+    for name in ['Hogs', 'BeefCows', 'MilkCows', 'OtherCattle']:
+        scenarios[name] = df_AA[name].to_numpy(dtype=float)
+
+    features = weather.lookup_many(scenarios['Name'], scenarios['Year'])
+    for name in ['Jul_T', 'Jul_ppt', 'Jul_ppt_sq', 'June_ppt']:
+        scenarios[name] = features[:, weather.features.index(name)]
+    scenarios['May_P'] = May_P
+
+    return scenarios
+
+
+def run_scenarios(scenarios, **kwargs):
+    """
+    Evaluate every scenario with complete inputs, returns the scenario table
+    with one column per model output (NaN where the weather is missing).
+    kwargs are passed to parallel_sampling.run_samples
+    """
+    complete = scenarios[x_names + w_names].notna().all(axis=1).to_numpy()
+    X = scenarios.loc[complete, x_names].to_numpy(dtype=float)
+    W = scenarios.loc[complete, w_names].to_numpy(dtype=float)
+
+    out = run_samples(X, W, **kwargs)
+
+    results = scenarios.copy()
+    for name, val in out.items():
+        results[name] = np.nan
+        results.loc[complete, name] = val
+
+    return results
@@ -0,0 +1,111 @@
+# -*- coding: utf-8 -*-
+"""
+============================================
+Weather features of the crop yield models from monthly PRISM data
+
+The monthly PRISM file (Name, Year, Month, ppt (mm), tmean (degrees C)) is
+parsed once into a (station, year) -> feature vector index:
+
+ Jul_T, Jul_ppt, Jul_ppt_sq, June_ppt           (corn yield model)
+ JulAug_T, JulAug_ppt, JulAug_ppt_sq            (soy yield model)
+
+JulAug_* are the means of the July and August values. May_P (May planting
+progress) is not a weather variable and is not part of the PRISM data.
+
+The index is cached next to the CSV file as '<file>.idx.npz' and rebuilt
+only when the CSV changes, so any station/year range loads without
+reparsing the CSV.
+
+============================================
+"""
+
+import os
+
+import numpy as np
+import pandas as pd
+
+
+class WeatherIndex(object):
+    """
+    (station, year) -> weather feature vector
+    """
+    features = ['Jul_T', 'Jul_ppt', 'Jul_ppt_sq', 'June_ppt', 'JulAug_T', 'JulAug_ppt', 'JulAug_ppt_sq']
+
+    def __init__(self, stations, years, values):
+        self.stations = np.asarray(stations, dtype=str)
+        self.years = np.asarray(years, dtype=int)
+        self.values = np.asarray(values, dtype=float)
+        self._row = {(s, y): i for i, (s, y) in enumerate(zip(self.stations, self.years))}
+
+    @classmethod
+    def from_monthly(cls, df_W):
+        """
+        Build the index from the monthly PRISM DataFrame
+        """
+        monthly = df_W.pivot_table(index=['Name', 'Year'], columns='Month',
+                                   values=['tmean (degrees C)', 'ppt (mm)'], aggfunc='first')
+        monthly = monthly.reindex(columns=pd.MultiIndex.from_product([['tmean (degrees C)', 'ppt (mm)'], range(1, 13)]))
+        T = monthly['tmean (degrees C)']
+        P = monthly['ppt (mm)']
+
+        JulAug_ppt = (P[7] + P[8]) / 2
+        values = np.column_stack((T[7], P[7], P[7] ** 2, P[6],
+                                  (T[7] + T[8]) / 2, JulAug_ppt, JulAug_ppt ** 2))
+
+        return cls(monthly.index.get_level_values('Name'), monthly.index.get_level_values('Year'), values)
+
+    @classmethod
+    def from_csv(cls, path, cache=True):
+        """
+        Load the index of a PRISM CSV file, from the binary cache when it is
+        up to date
+        """
+        cache_file = path + '.idx.npz'
+        stat = os.stat(path)
+        source = np.array([stat.st_size, stat.st_mtime_ns])
+
+        if cache and os.path.exists(cache_file):
+            with np.load(cache_file) as data:
+                if np.array_equal(data['source'], source) and list(data['features']) == cls.features:
+                    return cls(data['stations'], data['years'], data['values'])
+
+        index = cls.from_monthly(pd.read_csv(path))
+        if cache:
+            with open(cache_file, 'wb') as f:
+                np.savez(f, stations=index.stations, years=index.years, values=index.values,
+                         features=np.array(cls.features), source=source)
+        return index
+
+    def lookup(self, station, year):
+        """
+        Feature vector of one station and year (NaN if not available)
+        """
+        i = self._row.get((station, int(year)))
+        if i is None:
+            return np.full(len(self.features), np.nan)
+        return self.values[i]
+
+    def lookup_many(self, stations, years):
+        """
+        (n, n_features) array of the features of n (station, year) pairs
+        """
+        rows = np.array([self._row.get((s, int(y)), -1) for s, y in zip(stations, years)], dtype=int)
+        out = np.full((len(rows), len(self.features)), np.nan)
+        found = rows >= 0
+        out[found] = self.values[rows[found]]
+        return out
+
+    def to_frame(self, start=None, stop=None):
+        """
+        Features as a DataFrame (Name, Year, features) for years start - stop
+        """
+        keep = np.ones(len(self.years), dtype=bool)
+        if start is not None:
+            keep &= self.years >= start
+        if stop is not None:
+            keep &= self.years <= stop
+
+        df = pd.DataFrame(self.values[keep], columns=self.features)
+        df.insert(0, 'Year', self.years[keep])
+        df.insert(0, 'Name', self.stations[keep])
+        return df